@@ -0,0 +1,235 @@
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+from bag import en
+from board import Board, STANDARD
+
+# The symbol of a square without a tile on it in a tile array.
+EMPTY = -1
+
+# What a cross sum is where a square doesn't join a cross word.
+NO_CROSS = -1
+
+# Boards as NumPy arrays, indexed [board, y, x] so that many boards (of the
+# same size and language) can be looked at together:
+#
+#   tiles   int8, the symbol of every tile, EMPTY for the empty squares
+#   blanks  bool, which tiles are blanks
+#   values  int16, what every tile is worth, 0 for blanks and empty squares
+#
+# NumPy is optional. Nothing else depends on this module, and it can only be
+# used if NumPy is installed.
+
+def tile_array(boards):
+  """Stacks the tiles of some boards into one array.
+
+  @param boards: A list of Boards of the same size and lexicon.
+
+  @returns: An int8 array of shape (boards, size, size)."""
+
+  _require()
+  size = boards[0].size
+  tiles = numpy.empty((len(boards), size, size), numpy.int8)
+  for i, board in enumerate(boards):
+    symbols = board.dawg.symbols
+    tiles[i] = [[EMPTY if '.' == l else symbols[l] for l in row] for row in board.grid]
+  return tiles
+
+def value_array(boards, tiles, blanks=None):
+  """Works out what the tiles of some boards are worth.
+
+  @param boards: The boards `tiles' are of.
+  @param tiles: An array of their tiles, as `tile_array' returns.
+  @param blanks: An array of which tiles are blanks, none of them by default.
+
+  @returns: An int16 array of the same shape."""
+
+  _require()
+  values = numpy.empty(tiles.shape, numpy.int16)
+  for i, board in enumerate(boards):
+    # The board's values by symbol, with the blank's last, which is what an
+    # EMPTY symbol picks out. Empty squares are zeroed below.
+    values[i] = numpy.asarray(board._values, numpy.int16)[tiles[i]]
+
+  values[tiles == EMPTY] = 0
+  if blanks is not None:
+    values[blanks] = 0
+  return values
+
+def cross_words(tiles, values, transposed):
+  """Works out the cross word every empty square would join, i.e. the run of
+  tiles above and below it for an across (False) play, or to its left and
+  right for a down (True) play, for every square at once.
+
+  @param tiles: An array of tiles, as `tile_array' returns.
+  @param values: An array of their values, as `value_array' returns.
+  @param transposed: Whether the play is down.
+
+  @returns: A (sums, starts, ends) tuple of int16 arrays of the same shape:
+    the sum of the values of the cross word's tiles (NO_CROSS where there
+    isn't one or the square isn't empty), and the first and last squares of
+    the cross word along its line, tile included."""
+
+  _require()
+  occupied = tiles != EMPTY
+
+  # The runs are worked out along the last axis, so put the cross words'
+  # direction there.
+  if not transposed:
+    occupied, values = occupied.swapaxes(1, 2), values.swapaxes(1, 2)
+
+  before_sums, before_lengths = _runs_before(occupied, values)
+  after_sums, after_lengths = _runs_before(occupied[..., ::-1], values[..., ::-1])
+  after_sums, after_lengths = after_sums[..., ::-1], after_lengths[..., ::-1]
+
+  index = numpy.arange(occupied.shape[-1])
+  cross = ~occupied & (before_lengths + after_lengths > 0)
+  sums = numpy.where(cross, before_sums + after_sums, NO_CROSS).astype(numpy.int16)
+  starts = (index - before_lengths).astype(numpy.int16)
+  ends = (index + after_lengths).astype(numpy.int16)
+
+  if not transposed:
+    sums, starts, ends = sums.swapaxes(1, 2), starts.swapaxes(1, 2), ends.swapaxes(1, 2)
+  return sums, starts, ends
+
+def anchor_array(tiles, start=STANDARD.start):
+  """Works out the anchors of some boards: the empty squares next to a tile,
+  or the start square of a board with nothing on it yet.
+
+  @param tiles: An array of tiles, as `tile_array' returns.
+  @param start: The (x, y) start square of the boards' layout.
+
+  @returns: A bool array of the same shape."""
+
+  _require()
+  occupied = tiles != EMPTY
+
+  neighbours = numpy.zeros(occupied.shape, bool)
+  neighbours[:, 1:, :] |= occupied[:, :-1, :]
+  neighbours[:, :-1, :] |= occupied[:, 1:, :]
+  neighbours[:, :, 1:] |= occupied[:, :, :-1]
+  neighbours[:, :, :-1] |= occupied[:, :, 1:]
+  anchors = neighbours & ~occupied
+
+  x, y = start
+  unopened = ~occupied[:, y, x]
+  anchors[unopened] = False
+  anchors[unopened, y, x] = True
+  return anchors
+
+def _runs_before(occupied, values):
+  """For every square along the last axis, the sum and length of the run of
+  tiles that ends just before it.
+
+  @returns: A (sums, lengths) tuple of arrays shaped like `occupied'."""
+
+  index = numpy.arange(occupied.shape[-1])
+
+  # The last empty square before every square, or -1 if there isn't one.
+  last = numpy.maximum.accumulate(numpy.where(occupied, -1, index), axis=-1)
+  previous = numpy.empty_like(last)
+  previous[..., 0] = -1
+  previous[..., 1:] = last[..., :-1]
+
+  # totals[..., i] is the sum of the values before square i.
+  totals = numpy.zeros(occupied.shape[:-1] + (occupied.shape[-1] + 1,), numpy.int32)
+  totals[..., 1:] = numpy.cumsum(values, axis=-1)
+
+  sums = totals[..., :-1] - numpy.take_along_axis(totals, previous + 1, axis=-1)
+  return sums, index - previous - 1
+
+def _require():
+  if numpy is None:
+    raise ImportError("Board arrays need NumPy, which isn't installed.")
+
+class ArrayBoard (Board):
+  """A Board that also keeps its state as NumPy arrays (see above), worked
+  out again after every play and undo:
+
+    tiles, blanks, values  (size, size) arrays of the tiles on the board
+    cross_sums             per direction, the cross sum of every square
+    cross_starts           per direction, where the cross words start
+    cross_ends             per direction, and where they end
+    anchor_mask            the anchors
+
+  The arrays are replaced rather than changed, so copies of the board can
+  share them."""
+
+  def __init__(self, language=en, dawg=None, layout=STANDARD):
+    _require()
+    Board.__init__(self, language, dawg, layout)
+    self.blanks = numpy.zeros((self.size, self.size), bool)
+    self._blank_history = []
+    self._refresh()
+
+  def __copy__(self):
+    board = Board.__copy__(self)
+    board._blank_history = []
+    return board
+
+  @classmethod
+  def from_grid(klass, grid, language=en, dawg=None, layout=STANDARD, blanks=None):
+    """Like `Board.from_grid'.
+
+    @param blanks: A list of (x, y) squares whose tiles are blanks."""
+
+    board = super(ArrayBoard, klass).from_grid(grid, language, dawg, layout)
+    for x, y in blanks or []:
+      board.blanks[y, x] = True
+    board._refresh()
+    return board
+
+  def __getstate__(self):
+    state = Board.__getstate__(self)
+    state['blanks'] = zip(*numpy.nonzero(self.blanks)[::-1])
+    return state
+
+  def __setstate__(self, state):
+    board = ArrayBoard.from_grid(state['grid'], state['language'], state['dawg'], state['layout'], state['blanks'])
+    self.__dict__.update(board.__dict__)
+
+  def play(self, word, start, end, tiles=None):
+    """Like `Board.play', but keeps track of blanks.
+
+    @param tiles: The tiles the word is played with, with `_' for blanks, as
+      in the moves `moves' returns. The word itself by default."""
+
+    squares = self._squares(start, end, len(self.dawg.tokenize(word)))
+    empty = [(x, y) for x, y in squares if '.' == self.grid[y][x]]
+    score = Board.play(self, word, start, end)
+
+    self._blank_history.append(self.blanks)
+    if tiles is not None:
+      self.blanks = self.blanks.copy()
+      for (x, y), tile in zip(squares, self.dawg.tokenize(tiles)):
+        if '_' == tile and (x, y) in empty:
+          self.blanks[y, x] = True
+
+    self._refresh()
+    return score
+
+  def undo(self):
+    Board.undo(self)
+    self.blanks = self._blank_history.pop()
+    self._refresh()
+
+  def _squares(self, start, end, length):
+    if start[0] != end[0]:
+      return [(start[0]+j, start[1]) for j in xrange(length)]
+    return [(start[0], start[1]+j) for j in xrange(length)]
+
+  def _refresh(self):
+    boards = [self]
+    tiles = tile_array(boards)
+    values = value_array(boards, tiles, self.blanks[numpy.newaxis])
+
+    self.tiles, self.values = tiles[0], values[0]
+    self.cross_sums, self.cross_starts, self.cross_ends = {}, {}, {}
+    for transposed in (False, True):
+      sums, starts, ends = cross_words(tiles, values, transposed)
+      self.cross_sums[transposed] = sums[0]
+      self.cross_starts[transposed] = starts[0]
+      self.cross_ends[transposed] = ends[0]
+    self.anchor_mask = anchor_array(tiles, self.layout.start)[0]
@@ -1,6 +1,10 @@
 # coding=UTF-8
 
-from random import randint
+import unicodedata
+from random import Random
+
+# Draws with no random number generator of their own use this one.
+_rng = Random()
 
 class en:
   dictionary = 'en.txt'
@@ -18,7 +22,7 @@ class en:
   }
 
   @classmethod
-  def normalize(word):
+  def normalize(klass, word):
     return word
 
 class es:
@@ -39,43 +43,155 @@ class es:
 
   @classmethod
   def normalize(klass, word):
-    import unicodedata
-
-    def no_diacritics(s):
-      return unicodedata.normalize('NFKD', s).encode('ASCII', 'ignore')
+    # Plain ASCII words have no accents to remove.
+    try:
+      word.encode('ASCII')
+      return word
+    except UnicodeError:
+      pass
 
     # For spanish we want to remove all accents, but retain the ñ character.
-    frags = [no_diacritics(f) for f in word.split(u'ñ')]
+    frags = [_no_diacritics(f) for f in word.split(u'ñ')]
     return u'ñ'.join(frags)
 
-class Bag:
+def _no_diacritics(s):
+  return unicodedata.normalize('NFKD', s).encode('ASCII', 'ignore')
+
+class BagError (Exception):
+  pass
+
+class Bag (object):
   def __init__(self, language=en):
-    self.bag = []
+    """Creates a full bag.
+
+    The bag is kept as a count per letter rather than a tile per tile, so
+    drawing a tile, putting one back or counting them doesn't depend on how
+    many are left.
+
+    @param language: A language class, whose distribution fills the bag."""
+
     self.language = language
-    for letter, count in self.language.distribution.iteritems():
-      self.bag += [letter] * count
+    self.letters = sorted(language.distribution.keys())
+    self.index = dict((l, i) for i, l in enumerate(self.letters))
+    self.counts = [language.distribution[l] for l in self.letters]
+    self.total = sum(self.counts)
+
+    # The index of every drawn tile's letter, so that `undo' can put it back.
+    self.drawn = []
+
+  def __copy__(self):
+    bag = Bag.__new__(Bag)
+    bag.__dict__.update(self.__dict__)
+    bag.counts = list(self.counts)
+    bag.drawn = list(self.drawn)
+    return bag
+
+  def __deepcopy__(self, memo):
+    return self.__copy__()
 
   def remaining(self, letter = None):
     if not letter:
-      return len(self.bag)
+      return self.total
+    elif letter not in self.index:
+      return 0
     else:
-      return len(filter(lambda c: c == letter, self.bag))
+      return self.counts[self.index[letter]]
 
-  def random(self, draw = True):
-    if len(self.bag) == 0:
+  def random(self, draw = True, rng = None):
+    if self.total == 0:
       raise BagError("The bag is empty.")
-    else:
-      index = randint(0, len(self.bag)-1)
 
-      c = self.bag[index]
-      if draw:
-        self.bag.remove(c)
-      return c
+    c = self.sample(1, rng)[0]
+    if draw:
+      self._take(self.index[c])
+    return c
 
   def draw(self, letter):
-    if len(self.bag) == 0:
+    if self.total == 0:
       raise BagError("The bag is empty.")
-    elif letter not in self.bag:
+    elif not self.remaining(letter):
       raise BagError("There are no more `%s' remaining in the bag." % letter)
     else:
-      self.bag.remove(letter)
+      self._take(self.index[letter])
+
+  def draw_rack(self, n, rng = None):
+    """Draws tiles at random, weighted by how many of each letter are left.
+
+    @param n: How many tiles to draw, at most. Fewer are drawn if the bag
+      runs out.
+    @param rng: A `random.Random' to draw with, for reproducible draws.
+
+    @returns: A list of the tiles drawn."""
+
+    tiles = self.sample(n, rng)
+    for tile in tiles:
+      self._take(self.index[tile])
+    return tiles
+
+  def sample(self, n, rng = None):
+    """Like `draw_rack', but leaves the tiles in the bag. The tiles are
+    still picked without replacement, so no more of a letter is picked than
+    the bag holds.
+
+    @param n: How many tiles to pick, at most.
+    @param rng: A `random.Random' to pick with.
+
+    @returns: A list of tiles."""
+
+    rng = rng or _rng
+    counts = list(self.counts)
+    total = self.total
+
+    tiles = []
+    for i in xrange(min(n, total)):
+      r = rng.randrange(total)
+      j = 0
+      while r >= counts[j]:
+        r -= counts[j]
+        j += 1
+      counts[j] -= 1
+      total -= 1
+      tiles.append(self.letters[j])
+    return tiles
+
+  def put(self, letter):
+    """Puts a tile back in the bag, e.g. when exchanging tiles.
+
+    @param letter: The tile."""
+
+    if letter not in self.index:
+      raise BagError("There are no `%s' tiles in this game." % letter)
+    self.counts[self.index[letter]] += 1
+    self.total += 1
+
+  def undo(self, count = 1):
+    """Puts the last tiles drawn back into the bag.
+
+    @param count: How many tiles to put back."""
+
+    if count > len(self.drawn):
+      raise BagError("Only %d tiles have been drawn." % len(self.drawn))
+    for i in xrange(count):
+      self.counts[self.drawn.pop()] += 1
+    self.total += count
+
+  def snapshot(self):
+    """Returns the bag's contents, for `restore'."""
+
+    return (tuple(self.counts), len(self.drawn))
+
+  def restore(self, snapshot):
+    """Puts the bag back the way it was when a snapshot was taken. Draws
+    since then can't be undone afterwards.
+
+    @param snapshot: What `snapshot' returned."""
+
+    counts, drawn = snapshot
+    self.counts = list(counts)
+    self.total = sum(counts)
+    del self.drawn[drawn:]
+
+  def _take(self, index):
+    self.drawn.append(index)
+    self.counts[index] -= 1
+    self.total -= 1
@@ -0,0 +1,72 @@
+from itertools import islice
+
+from bag import en
+from board import Board, compact_grid
+from executor import SERIAL
+
+# How many positions are read ahead and grouped by board at a time, and the
+# most racks of one board that go to a worker together.
+BATCH_SIZE = 256
+GROUP_SIZE = 16
+
+def moves(positions, language=en, k=None, executor=SERIAL, batch_size=BATCH_SIZE):
+  """Generates the moves of many (board, rack) positions, e.g. from separate
+  games.
+
+  Positions are read a batch at a time and the ones on the same board are
+  grouped, so that a board's cross-checks and anchors are only worked out
+  once for several racks. The groups are handed to the executor, whose
+  workers all share the language's lexicon (see `lexicon.get').
+
+  @param positions: An iterable of (grid, rack) tuples, where a grid is a
+    list of rows of letters like `Board.grid'.
+  @param language: A language class from `bag'.
+  @param k: Only generate the `k' highest scoring moves of each position (see
+    `Board.top_moves'). All of them by default.
+  @param executor: What to generate the moves on (see `executor').
+  @param batch_size: How many positions to group at a time.
+
+  @returns: A generator of a list of moves per position, in the same order
+    as the positions, each as soon as it and those before it are ready."""
+
+  # Results come back a group at a time, so hold on to them until every
+  # position before them has been yielded.
+  results = {}
+  ready = 0
+  for indices, group in executor.imap(_moves, _groups(positions, language, k, batch_size)):
+    results.update(zip(indices, group))
+    while ready in results:
+      yield results.pop(ready)
+      ready += 1
+
+def _groups(positions, language, k, batch_size):
+  # Yields a (grid, language, racks, k, indices) task per group of racks on
+  # the same board, where the indices are the racks' positions.
+  positions = enumerate(positions)
+  while True:
+    batch = list(islice(positions, batch_size))
+    if not batch:
+      return
+
+    groups = {}
+    order = []
+    for i, (grid, rack) in batch:
+      grid = compact_grid(grid)
+      if grid not in groups:
+        groups[grid] = []
+        order.append(grid)
+      groups[grid].append((i, rack))
+
+    for grid in order:
+      group = groups[grid]
+      for j in xrange(0, len(group), GROUP_SIZE):
+        chunk = group[j:j + GROUP_SIZE]
+        yield (grid, language, [rack for i, rack in chunk], k, [i for i, rack in chunk])
+
+def _moves(task):
+  # Generates the moves of every rack on one board. Runs in executor workers.
+  grid, language, racks, k, indices = task
+  board = Board.from_grid(grid, language)
+  if k is None:
+    return indices, [board.moves(rack) for rack in racks]
+  return indices, [board.top_moves(rack, k) for rack in racks]
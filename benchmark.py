@@ -0,0 +1,311 @@
+# coding=UTF-8
+
+import cPickle as pickle
+import json
+import os
+import sys
+import traceback
+from random import Random
+from timeit import default_timer as clock
+
+import bag
+import player
+from bag import Bag
+from board import Board
+from dawg import Dawg
+from game import Game
+
+# Every benchmark is timed this many times and the fastest run is reported.
+REPEAT = 3
+
+# Seeds whatever the benchmarks sample, so that runs can be compared.
+SEED = 2012
+
+# How many dictionary words the lexicon benchmarks build graphs from.
+LEXICON_WORDS = 20000
+
+# The budget of the search benchmarks.
+SEARCH_NODES = 10
+SEARCH_DEPTH = 2
+
+# Positions taken from games of highest scoring moves, at the start, after two
+# turns, after ten and at the end.
+EMPTY = ['.' * 15] * 15
+
+class BenchmarkError (Exception):
+  pass
+
+POSITIONS = {
+  'en': [
+    ('empty', EMPTY),
+    ('opening', [
+      '...............',
+      '...............',
+      '...............',
+      '...............',
+      '...............',
+      '...............',
+      '..dex..........',
+      '...fundic......',
+      '...............',
+      '...............',
+      '...............',
+      '...............',
+      '...............',
+      '...............',
+      '...............']),
+    ('midgame', [
+      'chai...........',
+      '..n............',
+      '..t............',
+      '..h............',
+      '..o............',
+      '.gid...w.......',
+      '..dex..r.......',
+      '...fundic......',
+      '.......n....z..',
+      '.....bogey..e..',
+      '...glim.herls..',
+      '............t..',
+      '...............',
+      '...............',
+      '...............']),
+    ('endgame', [
+      'chainsaws.g.ala',
+      '.on..eve.outlet',
+      '..titrators..yo',
+      '.pht.a..w.tie.p',
+      '..o......toft..',
+      '.gid.jaws....c.',
+      '..dex.drew.exon',
+      '...fundic.at.to',
+      '..ba...n.brazas',
+      '.q.n.bogey..en.',
+      'pi.glim.herls.r',
+      'h..s.......etui',
+      'a.y.add.jubes.v',
+      'squire.mome...e',
+      'e.m..froe.elect'])
+  ],
+  'es': [
+    ('empty', EMPTY),
+    ('opening', [
+      '...............',
+      '...............',
+      '...............',
+      '...............',
+      '...............',
+      '...............',
+      '...............',
+      '.......xeca....',
+      '...............',
+      '...............',
+      '...............',
+      '...............',
+      '...............',
+      '...............',
+      '...............']),
+    ('midgame', [
+      '...............',
+      '...............',
+      '...............',
+      '..............e',
+      '..........mayor',
+      '.........cid.hi',
+      '.....ruedo....n',
+      'tolete.xeca...a',
+      '........sarde..',
+      '......miel.....',
+      '...............',
+      '...............',
+      '...............',
+      '...............',
+      '...............']),
+    ('endgame', [
+      u'.......sigla...',
+      u'.t.........dos.',
+      u'.u......puposo.',
+      u'fe.........n..e',
+      u'et........mayor',
+      u'.a..les..cid.hi',
+      u'.n.c.ruedo.oh.n',
+      u'tolete.xeca...a',
+      u'..o.....sarde..',
+      u'..bao.miel.....',
+      u'.jiña..........',
+      u'zuna...........',
+      u'ura...b........',
+      u'na.vide........',
+      u'arce..s........'])
+  ]
+}
+
+RACKS = {
+  'en': [('plain', 'retains'), ('blank', 'ret_ins'), ('blanks', 'ae_r_st'), ('awkward', 'qzxjkvw')],
+  'es': [('plain', 'aeinrst'), ('blank', 'aei_rst'), ('blanks', 'a_n_ros'), ('awkward', u'qzñxjvu')]
+}
+
+def lexicon(language, name):
+  """Builds minimized and plain graphs from a sample of the dictionary."""
+
+  words = [language.normalize(unicode(line.strip(), 'UTF-8')) for line in open(language.dictionary)]
+  words = Random(SEED).sample(words, min(LEXICON_WORDS, len(words)))
+  digraphs = [k for k in language.scores.keys() if len(k) > 1]
+
+  results = []
+  for minimize in (True, False):
+    def build():
+      dawg = Dawg(digraphs=digraphs, minimize=minimize)
+      dawg.load(words)
+      return len(dawg.masks)
+
+    seconds, nodes, peak = _time(build)
+    results.append(_result('lexicon', name, seconds, len(words), peak,
+      position=minimize and 'minimized' or 'trie', nodes=nodes))
+  return results
+
+def boards(language, name):
+  """Creates empty boards and boards from the canned positions."""
+
+  Board(language)
+  results = []
+
+  seconds, n, peak = _time(lambda: len([Board(language) for i in xrange(100)]))
+  results.append(_result('board', name, seconds, n, peak, position='empty'))
+
+  for position, grid in POSITIONS[name][1:]:
+    seconds, n, peak = _time(lambda: len([Board.from_grid(grid, language) for i in xrange(10)]))
+    results.append(_result('board', name, seconds, n, peak, position=position))
+  return results
+
+def moves(language, name):
+  """Generates every move, and the best one, of each canned position and
+  rack."""
+
+  results = []
+  for position, grid in POSITIONS[name]:
+    board = Board.from_grid(grid, language)
+    for rack_name, rack in RACKS[name]:
+      seconds, n, peak = _time(lambda: len(board.moves(rack)))
+      results.append(_result('moves', name, seconds, n, peak, position=position, rack=rack_name))
+
+      seconds, n, peak = _time(lambda: len(board.top_moves(rack, 1)))
+      results.append(_result('top_moves', name, seconds, n, peak, position=position, rack=rack_name))
+  return results
+
+def scores(language, name):
+  """Scores every move of each canned position over again."""
+
+  results = []
+  for position, grid in POSITIONS[name]:
+    board = Board.from_grid(grid, language)
+    ms = board.moves(RACKS[name][0][1])
+    seconds, n, peak = _time(lambda: len([board.score(m[0], m[2], m[3]) for m in ms]))
+    results.append(_result('score', name, seconds, n, peak, position=position))
+  return results
+
+def search(language, name):
+  """Runs the player's lookahead on the midgame with a node budget."""
+
+  position, grid = POSITIONS[name][2]
+
+  def move():
+    player.TABLE.clear()
+    game = Game()
+    game.board = Board.from_grid(grid, language)
+    game.bag = Bag(language)
+    p = player.Player(game, seed=SEED)
+    p.rack = RACKS[name][0][1]
+
+    # The search prints its decisions as it goes.
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+      p.move(max_nodes=SEARCH_NODES, max_depth=SEARCH_DEPTH)
+    finally:
+      sys.stdout.close()
+      sys.stdout = stdout
+    return p.nodes, p.depth
+
+  seconds, (nodes, depth), peak = _time(move)
+  return [_result('search', name, seconds, nodes, peak, position=position, nodes=nodes, depth=depth)]
+
+BENCHMARKS = [('lexicon', lexicon), ('board', boards), ('moves', moves), ('score', scores), ('search', search)]
+
+def run(names=None, languages=('en', 'es'), out=sys.stdout):
+  """Runs benchmarks, writing a JSON object per result to `out', one per
+  line, with the same keys in the same order every time so that the output
+  of two runs can be diffed.
+
+  @param names: The benchmarks to run, all of them by default.
+  @param languages: The names of the languages to run them for.
+  @param out: A file.
+
+  @returns: A list of result dicts."""
+
+  results = []
+  for benchmark, func in BENCHMARKS:
+    if names and benchmark not in names:
+      continue
+    for name in languages:
+      for result in func(getattr(bag, name), name):
+        out.write(json.dumps(result, sort_keys=True) + '\n')
+        out.flush()
+        results.append(result)
+  return results
+
+def _time(func):
+  # Returns the fastest of REPEAT runs of a function, what it returned and
+  # the most memory the runs took, in KB. A process' peak memory only ever
+  # goes up, so the runs are made in a child process of their own and it's
+  # that process' peak. What the function returns is sent back pickled, and
+  # nothing else it does is seen by the rest of the benchmarks.
+  read, write = os.pipe()
+  pid = os.fork()
+  if not pid:
+    os.close(read)
+    status = 0
+    try:
+      best = None
+      for i in xrange(REPEAT):
+        start = clock()
+        value = func()
+        seconds = clock() - start
+        if best is None or seconds < best:
+          best = seconds
+      with os.fdopen(write, 'wb') as f:
+        pickle.dump((best, value), f, pickle.HIGHEST_PROTOCOL)
+    except:
+      traceback.print_exc()
+      status = 1
+    finally:
+      # Without running the parent's cleanup, or flushing its output again.
+      os._exit(status)
+
+  os.close(write)
+  with os.fdopen(read, 'rb') as f:
+    data = f.read()
+  pid, status, usage = os.wait4(pid, 0)
+  if status:
+    raise BenchmarkError("A benchmark failed (exit status %d)." % os.WEXITSTATUS(status))
+
+  seconds, value = pickle.loads(data)
+  return seconds, value, usage.ru_maxrss
+
+def _result(benchmark, language, seconds, count, peak_rss_kb, position=None, rack=None, nodes=None, depth=None):
+  return {
+    'benchmark': benchmark,
+    'language': language,
+    'position': position,
+    'rack': rack,
+    'seconds': round(seconds, 6),
+    'count': count,
+    'per_second': round(count / seconds, 1) if seconds else None,
+    'nodes': nodes,
+    'depth': depth,
+    'peak_rss_kb': peak_rss_kb
+  }
+
+if __name__ == '__main__':
+  # Runs the benchmarks named on the command line, or all of them, e.g.
+  #   python benchmark.py moves search > results.json
+  run(sys.argv[1:])
@@ -1,7 +1,14 @@
+from heapq import heappush, heapreplace
+import time
+
 from dawg import *
 from bag import *
+import lexicon
+from transposition import key
 
-# Location of special squares.
+# Location of special squares on a standard board.
+#   Q quadruple word
+#   q quadruple letter
 #   T triple word
 #   t triple letter
 #   D double word
@@ -24,39 +31,221 @@ SPECIAL = [
   ['T','.','.','d','.','.','.','T','.','.','.','d','.','.','T']
 ]
 
-GRID_SIZE = 15
+# The size of a standard board.
+GRID_SIZE = len(SPECIAL)
+
+LETTER_MODS = {'d': 2, 't': 3, 'q': 4}
+WORD_MODS = {'D': 2, 'T': 3, 'Q': 4}
+
+BINGO_BONUS = 50
 
 class BoardError (Exception):
   pass
 
+class Layout (object):
+  def __init__(self, special, start=None):
+    """Describes a board: how big it is and where its premium squares are.
+
+    The premiums are also laid out along the lines move generation walks,
+    rows for across (False) plays and columns for down (True) plays, and
+    flattened into per-square multipliers indexed by y * size + x, the same
+    way as the board's own tables.
+
+    @param special: A square list of rows of premium squares, marked the same
+      way as `SPECIAL'.
+    @param start: The (x, y) square the first play has to cover, the middle
+      of the board by default."""
+
+    size = len(special)
+    if any(len(row) != size for row in special):
+      raise BoardError("A board layout has to be square.")
+
+    self.size = size
+    self.special = [list(row) for row in special]
+    self.start = start or (size // 2, size // 2)
+
+    # Layouts are in the key of every search table entry, so the hash is
+    # only worked out once.
+    self._key = (tuple(tuple(row) for row in self.special), self.start)
+    self._hash = hash(self._key)
+
+    self.lines = {False: self.special, True: [list(column) for column in zip(*self.special)]}
+    self.letter_mods = {}
+    self.word_mods = {}
+    for transposed, lines in self.lines.items():
+      self.letter_mods[transposed] = [LETTER_MODS.get(p, 1) for line in lines for p in line]
+      self.word_mods[transposed] = [WORD_MODS.get(p, 1) for line in lines for p in line]
+
+  # Layouts are equal if their squares are, so that a copy unpickled in
+  # another process is the same layout.
+  def __eq__(self, other):
+    return isinstance(other, Layout) and self._key == other._key
+
+  def __ne__(self, other):
+    return not self == other
+
+  def __hash__(self):
+    return self._hash
+
+  def __setstate__(self, state):
+    # Hashes aren't necessarily the same from one process to the next.
+    self.__dict__.update(state)
+    self._hash = hash(self._key)
+
+STANDARD = Layout(SPECIAL)
+
+def compact_grid(grid):
+  """Packs a grid into a hashable tuple of rows, each a string unless it has
+  a multi-character letter on it. `Board.from_grid' takes it as is.
+
+  @param grid: A list of rows of letters, `.' for the empty squares.
+
+  @returns: A tuple."""
+
+  return tuple(''.join(row) if all(len(l) == 1 for l in row) else tuple(row) for row in grid)
+
+def _put_back(rack, stack):
+  # Puts back the tiles a move generation search that's giving up still has
+  # taken off the rack, i.e. the plain symbols left on its stack.
+  for entry in stack:
+    if entry.__class__ is int:
+      rack[entry] += 1
+
 class Board (object):
-  def __init__(self, language=en):
-    self.dawg = Dawg(digraphs=[k for k in language.scores.keys() if len(k) > 1])
-    self.grid = []
-    self.language = language
+  def __init__(self, language=en, dawg=None, layout=STANDARD):
+    """Creates an empty board.
 
-    self._transposed = False
+    @param language: A language class from `bag'.
+    @param dawg: A prebuilt word graph to use instead of the language's
+      shared lexicon.
+    @param layout: The `Layout' of the board, a standard one by default."""
 
-    self._anchors_dirty = True
-    self._cached_anchors = None
+    if dawg is None:
+      dawg = lexicon.get(language)
 
-    # Initialize the board's grid.
-    for i in xrange(15):
-      self.grid.append(['.'] * 15)
+    self.dawg = dawg
+    self.grid = []
+    self.language = language
 
-    # Initialize the word search from the dictionary.
-    for line in open(language.dictionary):
-      self.dawg.insert(language.normalize(unicode(line.strip(), 'UTF-8')))
+    self.layout = layout
+    self.size = layout.size
+
+    # The value of every letter indexed by its symbol, with a blank's at the
+    # end like the counts of a rack.
+    self._values = [language.scores[l] for l in dawg.alphabet] + [language.scores['_']]
+
+    # The Zobrist hash of the tiles on the board (see `transposition').
+    self.hash = 0
+
+    # Every letter that can go on an empty square with nothing around it.
+    self._all_letters = dawg.mask(k for k in language.scores.keys() if k != '_')
+
+    # Every play records the old value of whatever it overwrites in a journal,
+    # so that `undo' can take it back without the board being copied. While a
+    # play is being made `_journal' is its list of (table, index, old value)
+    # writes, where a table of None means the anchor set.
+    self._journal = None
+    self._undo = []
+
+    # Initialize the board's grid, and the same squares column by column.
+    for i in xrange(self.size):
+      self.grid.append(['.'] * self.size)
+    self._columns = [['.'] * self.size for i in xrange(self.size)]
+
+    # Move generation works along `lines' of the board: rows for across
+    # (False) plays and columns for down (True) plays. A square's position on
+    # its line is its `x' and the line's index its `y', so down plays see the
+    # board transposed without anything being flipped. The tables below are
+    # indexed the same way, by y * self.size + x.
+    self._lines = {False: self.grid, True: self._columns}
+
+    # The cross-check of every square as a bitmask of letters, and the sum of
+    # the letters in the cross word a tile there would join (None if there
+    # isn't one). They're kept up to date by `play'.
+    self._cross_checks = {
+      False: [self._all_letters] * (self.size * self.size),
+      True: [self._all_letters] * (self.size * self.size)
+    }
+    self._cross_sums = {
+      False: [None] * (self.size * self.size),
+      True: [None] * (self.size * self.size)
+    }
+
+    # The anchor squares and how many empty non-anchor squares lead up to
+    # every square. Both are kept up to date by `play'.
+    self._anchors = set()
+    self._left_limits = {False: None, True: None}
+    self._cached_anchors = {False: None, True: None}
+    self._rebuild_anchors()
+
+  def __copy__(self):
+    """Copies the board's state, sharing the (read-only) dawg."""
+
+    board = object.__new__(self.__class__)
+    board.__dict__.update(self.__dict__)
+    board.grid = [list(row) for row in self.grid]
+    board._columns = [list(column) for column in self._columns]
+    board._lines = {False: board.grid, True: board._columns}
+    board._cross_checks = dict((k, list(v)) for k, v in self._cross_checks.items())
+    board._cross_sums = dict((k, list(v)) for k, v in self._cross_sums.items())
+    board._anchors = set(self._anchors)
+    board._left_limits = dict((k, list(v)) for k, v in self._left_limits.items())
+    board._cached_anchors = dict(self._cached_anchors)
+    board._undo = []
+    return board
+
+  @classmethod
+  def from_grid(klass, grid, language=en, dawg=None, layout=STANDARD):
+    """Creates a board with tiles already on it.
+
+    @param grid: A list of rows, each a sequence of letters with `.' for the
+      empty squares (e.g. another board's `grid').
+    @param language: A language class from `bag'.
+    @param dawg: A prebuilt word graph to use instead of the language's
+      shared lexicon.
+    @param layout: The `Layout' of the board, which has to be the grid's size.
+
+    @returns: A new Board."""
+
+    if len(grid) != layout.size:
+      raise BoardError("A %dx%d grid doesn't fit a %dx%d board." % (len(grid), len(grid), layout.size, layout.size))
+
+    board = klass(language, dawg, layout)
+    for y, row in enumerate(grid):
+      for x, letter in enumerate(row):
+        board.grid[y][x] = board._columns[x][y] = letter
+        if '.' != letter:
+          board.hash ^= key('square', y * board.size + x, letter)
+
+    board._rebuild_cross_checks()
+    board._rebuild_anchors()
+    return board
+
+  def __getstate__(self):
+    """Pickles the board as just its tiles. Everything else is derived from
+    them, and a shared lexicon pickles as its path, so sending a board to
+    another process never copies the word graph."""
+
+    return {
+      'grid': compact_grid(self.grid),
+      'language': self.language,
+      'dawg': self.dawg,
+      'layout': self.layout
+    }
+
+  def __setstate__(self, state):
+    board = Board.from_grid(state['grid'], state['language'], state['dawg'], state['layout'])
+    self.__dict__.update(board.__dict__)
 
   def __repr__(self):
     """Returns the string representation of the current board.
     
     @returns: String of the current board."""
 
-    result = '   ' + ' '.join(["%2d" % x for x in xrange(15)]) + '\n'
-    for y in xrange(15):
+    result = '   ' + ' '.join(["%2d" % x for x in xrange(self.size)]) + '\n'
+    for y in xrange(self.size):
       result += "%-4d" % y
-      for x in xrange(15):
+      for x in xrange(self.size):
         result += self.square(x, y) + '  '
       result += '\n'
     return result
@@ -69,78 +258,233 @@ class Board (object):
     
     @return: The character at the given location."""
 
-    x, y = self._coord(x,y)
     return self.grid[y][x]
 
   def moves(self, rack):
     """Generates all of the moves that are available on the board.
     
-    @param rack: A string of the letters available to play."""
-
-    moves = []
-    anchors = self.anchors()
-    for a in anchors:
-      moves += self._get_moves(a, rack)
-    moves = [(m[0], m[1], m[2], m[3], self.score(*m[1:])) for m in moves]
-
-    imoves = []
-    self._transposed = True
-    anchors = self.anchors()
-    for a in anchors:
-      imoves += self._get_moves(a, self.dawg.tokenize(rack))
-    imoves = [(m[0], m[1], self._coord(*m[2]), self._coord(*m[3]), self.score(*m[1:])) for m in imoves]
-    self._transposed = False
-
-    moves += imoves
+    @param rack: A string of the letters available to play.
+
+    @returns: A list of (word, tiles, start, end, score) tuples, highest
+      scoring first."""
+
+    moves = list(self.iter_moves(rack))
     moves.sort(lambda m1,m2: cmp(m1[4],m2[4]), reverse=True)
 
     return moves
 
-  def score(self, word, start, end):
+  def iter_moves(self, rack, deadline=None):
+    """Generates the moves that are available on the board one anchor at a
+    time, without collecting or ordering them.
+
+    @param rack: A string (or list) of the letters available to play.
+    @param deadline: A `time.time()' to stop generating at, if any.
+
+    @returns: A generator of (word, tiles, start, end, score) tuples."""
+
+    rack = self._rack_counts(self._tokenize_rack(rack))
+    for transposed in (False, True):
+      for a in self._line_anchors(transposed):
+        for m in self._get_moves(a, rack, transposed, deadline):
+          yield m
+        if deadline is not None and time.time() > deadline:
+          return
+
+  def top_moves(self, rack, k, deadline=None):
+    """Finds the `k' highest scoring moves, the same as `moves(rack)[:k]'
+    but without generating moves that can't make the cut. Anchors are
+    searched best bound first, and once `k' moves have been found the ones
+    whose upper bound is lower than the worst of them are skipped.
+
+    @param rack: A string (or list) of the letters available to play.
+    @param k: How many moves to return.
+    @param deadline: A `time.time()' to stop searching at, if any, with the
+      best moves found by then.
+
+    @returns: A list of at most `k' (word, tiles, start, end, score) tuples,
+      highest scoring first."""
+
+    rack = self._tokenize_rack(rack)
+    if k <= 0:
+      return []
+
+    anchors = []
+    for transposed in (False, True):
+      for a in self._line_anchors(transposed):
+        bound = self._anchor_bound(a, rack, transposed)
+        anchors.append((-bound, len(anchors), a, transposed))
+    anchors.sort()
+
+    # A min-heap of the best moves so far. Ties go to the move `moves' would
+    # have listed first, i.e. the one generated first.
+    heap = []
+    rack = self._rack_counts(rack)
+    for bound, order, a, transposed in anchors:
+      if len(heap) == k and -bound < heap[0][0]:
+        break
+
+      for i, move in enumerate(self._get_moves(a, rack, transposed, deadline)):
+        item = (move[4], -order, -i, move)
+        if len(heap) < k:
+          heappush(heap, item)
+        elif item > heap[0]:
+          heapreplace(heap, item)
+      if deadline is not None and time.time() > deadline:
+        break
+
+    return [item[3] for item in sorted(heap, reverse=True)]
+
+  def score(self, word, start, end, tiles=None):
     """Returns the score playing a word would yield including word and letter
     modifiers.
     
     @param word: A string of the word to play.
     @param start: An (x, y) tuple of the starting square.
-    @param end: An (x, y) tuple of the final square."""
+    @param end: An (x, y) tuple of the final square.
+    @param tiles: The tiles the word is played with, with `_' for blanks, as
+      in the moves `moves' returns. The word itself by default."""
+
+    tokens = self.dawg.tokenize(word)
+    blanks = self._blanks(word, tokens, tiles)
+    if len(tokens) == 1 and start == end:
+      return self._score_tile(tokens[0], blanks[0], start)
+
+    # Work along the word's line, where the premiums and cross sums of its
+    # squares are laid out one after the other.
+    transposed = start[0] == end[0]
+    x, y = self._coord(start[0], start[1], transposed)
+    line = self._lines[transposed][y]
+    index = y * self.size + x
+    scores = self.language.scores
+
+    tally = (0, 1, 0, 0)
+    for i, letter in enumerate(tokens):
+      if '.' == line[x+i]:
+        tally = self._tally(tally, scores['_' if blanks[i] else letter], index + i, transposed)
+      else:
+        points, mod, cross, used = tally
+        tally = (points + scores[letter], mod, cross, used)
 
-    # If this is a vertical play and `score' is being called outside the 
-    # context of self.moves, some coordinate transformation needs to take
-    # place.
+    points, mod, cross, used = tally
+    score = points * mod + cross
+    if used == 7:
+      score += BINGO_BONUS
+    return score
 
-    start = self._coord(*start)
-    end = self._coord(*end)
+  def validate(self, word, start, end, tiles=None):
+    """Checks that a word can be played, i.e. that it fits on the board,
+    places at least one tile, joins up with the tiles already there, and that
+    it and every cross word it forms are words. It's scored along the way.
 
-    not_transposed = not self._transposed
-    if not_transposed and start[1] != end[1]:
-      # Re-map the co-ords so we get an accurate score.
-      self._transposed = True
+    @param word: A string of the word to play.
+    @param start: An (x, y) tuple of the starting square.
+    @param end: An (x, y) tuple of the final square.
+    @param tiles: The tiles the word is played with, as in `score'.
+
+    @returns: The score playing the word would yield.
+
+    @raises BoardError: If the play isn't legal."""
+
+    d = self.dawg
+    tokens = d.tokenize(word)
+    blanks = self._blanks(word, tokens, tiles)
+    if len(tokens) == 1 and start == end:
+      x, y = start
+      if not (0 <= x < self.size and 0 <= y < self.size) or '.' != self.grid[y][x]:
+        raise BoardError("Illegal play [%d,%d]." % (x, y))
+      if start not in self._anchors:
+        raise BoardError("`%s' isn't connected to the tiles on the board." % word)
+      return self._score_tile(tokens[0], blanks[0], start, True)
+
+    # Work along the word's line, the same way move generation does.
+    transposed = start[0] == end[0]
+    x, y = self._coord(start[0], start[1], transposed)
+    last, line_index = self._coord(end[0], end[1], transposed)
+    if len(tokens) < 2 or line_index != y or last - x + 1 != len(tokens) or \
+       not (0 <= x and last < self.size and 0 <= y < self.size):
+      raise BoardError("`%s' doesn't fit from %r to %r." % (word, start, end))
+
+    line = self._lines[transposed][y]
+    if (x > 0 and '.' != line[x-1]) or (last + 1 < self.size and '.' != line[last+1]):
+      raise BoardError("`%s' is only part of the word it would make." % word)
+
+    node = d.node(word)
+    if node is None or not d.accepting[node]:
+      raise BoardError("`%s' isn't a word." % word)
+
+    # The cross-check of a square is the set of letters that form a word
+    # across it, so the cross words don't need looking up one by one.
+    checks = self._cross_checks[transposed]
+    tally = (0, 1, 0, 0)
+    anchored = False
+    for i, tile in enumerate(tokens):
+      s = line[x+i]
+      if '.' == s:
+        if tile not in d.symbols or not checks[y * self.size + x + i] & (1 << d.symbols[tile]):
+          raise BoardError("`%s' at %r doesn't form a word across it." % (tile, self._coord(x+i, y, transposed)))
+        anchored = anchored or self._coord(x+i, y, transposed) in self._anchors
+        tally = self._tally(tally, self.language.scores['_' if blanks[i] else tile], y * self.size + x + i, transposed)
+      elif s == tile:
+        points, mod, cross, used = tally
+        tally = (points + self.language.scores[s], mod, cross, used)
+      else:
+        raise BoardError("Illegal play [%d,%d]." % self._coord(x+i, y, transposed))
 
-    # Make a faux-iterator to get the next square of a word instead of having
-    # to check if it's horizontally or vertically placed each time.
-    if start[0] != end[0]:
-      square = lambda j: (start[0]+j, start[1])
-    else:
-      square = lambda j: (start[0], start[1]+j)
+    points, mod, cross, used = tally
+    if not used:
+      raise BoardError("`%s' is already on the board." % word)
+    if not anchored:
+      raise BoardError("`%s' isn't connected to the tiles on the board." % word)
+
+    score = points * mod + cross
+    if used == 7:
+      score += BINGO_BONUS
+    return score
+
+  def _blanks(self, word, tokens, tiles):
+    """Works out which letters of a word are played with blanks.
 
-    score = 0
+    @param tokens: The word's letters.
+    @param tiles: Its tiles, as `score' takes them, or None.
 
-    # Score each letter, including the letter bonuses.
-    for i, letter in enumerate(self.dawg.tokenize(word)):
-      score += self._get_letter_score(letter,square(i))
+    @returns: A list of whether each letter is a blank.
 
-    # Score any cross words that were created.
-    score += self._get_word_cross_scores(word, square)
+    @raises BoardError: If the tiles aren't the word's."""
 
-    # Multiply by any word score modifiers.
-    score *= self._get_word_score_mod(word, square)
+    if tiles is None:
+      return [False] * len(tokens)
 
-    # Add a bingo bonus.
-    score += self._get_bingo_bonus(word, square)
+    placed = self.dawg.tokenize(tiles)
+    if len(placed) != len(tokens) or any(p != t and '_' != p for p, t in zip(placed, tokens)):
+      raise BoardError("`%s' can't be played with `%s'." % (word, tiles))
+    return ['_' == p for p in placed]
 
-    if not_transposed:
-      self._transposed = False
+  def _score_tile(self, tile, blank, (x,y), validate=False):
+    """Scores a play of a single tile by the words it makes along both lines,
+    since it doesn't lie along either one in particular. Move generation
+    finds the same play as the word along the line it makes one on.
 
+    @param tile: The letter.
+    @param blank: Whether it's played with a blank.
+    @param validate: Whether to check that it makes at least one word and
+      that they're all words.
+
+    @returns: The score."""
+
+    d = self.dawg
+    score = words = 0
+    for transposed in (False, True):
+      i, j = self._coord(x, y, transposed)
+      index = j * self.size + i
+      if self._cross_sums[transposed][index] is None:
+        continue
+      if validate and (tile not in d.symbols or not self._cross_checks[transposed][index] & (1 << d.symbols[tile])):
+        raise BoardError("`%s' at %r doesn't form a word." % (tile, (x, y)))
+      score += self._tally((0, 1, 0, 0), self.language.scores['_' if blank else tile], index, transposed)[2]
+      words += 1
+
+    if validate and not words:
+      raise BoardError("Words have to be at least two letters long.")
     return score
 
   def cross_section(self, x, y):
@@ -153,21 +497,7 @@ class Board (object):
     @returns: A string with the letters surrounding a blank square 
       (i.e. `sam.le') or a single `.' character."""
 
-    cross = "."
-    up_y, down_y = y - 1, y + 1
-    s = self.square(x, up_y)
-    while up_y >= 0 and '.' != s:
-      cross = s + cross
-      up_y -= 1
-      s = self.square(x, up_y)
-
-    s = self.square(x, down_y)
-    while down_y < 15 and '.' != s:
-      cross += s
-      down_y += 1
-      s = self.square(x, down_y)
-
-    return cross
+    return self._cross_section(x, y, False)
 
   def cross_set(self, x, y):
     """Returns a list of the characters which create valid words (vertically)
@@ -180,11 +510,7 @@ class Board (object):
 
     s = self.square(x,y)
     if '.' == s:
-      cross_section = self.cross_section(x, y)
-      if '.' == cross_section:
-        return [c for c in self.language.scores.keys() if c != '_']
-      else:
-        return self.dawg.pivot_search(cross_section)
+      return self.dawg.letters(self._cross_checks[False][y * self.size + x])
     else:
       return [s]
 
@@ -193,20 +519,253 @@ class Board (object):
 
     @returns: A list of (x,y) coordinate tuples."""
 
-    if self._anchors_dirty:
-      # If the starting square hasn't been played it is necessarily the only anchor
-      if self.square(7, 7) == '.': return [(7,7)] 
+    return self._line_anchors(False)
+
+  def _tokenize_rack(self, rack):
+    if isinstance(rack, basestring):
+      rack = self.dawg.tokenize(rack)
+    return list(rack)
+
+  def _rack_counts(self, rack):
+    """Turns a rack into the multiset move generation works with: a list of
+    how many of each letter there are, indexed by the dawg's symbols, with
+    the number of blanks at the end. Tiles the dawg doesn't know are dropped.
+
+    @param rack: A list of tiles.
+
+    @returns: A list of counts."""
+
+    d = self.dawg
+    counts = [0] * (len(d.alphabet) + 1)
+    for tile in rack:
+      if '_' == tile:
+        counts[-1] += 1
+      elif tile in d.symbols:
+        counts[d.symbols[tile]] += 1
+    return counts
+
+  def _anchor_bound(self, (x,y), rack, transposed):
+    """Returns an upper bound on the score of any move through an anchor.
+
+    The move has to fit in the window of squares around the anchor that the
+    rack can reach. Its letters can't score more than the tiles already in
+    the window plus the rack's best tiles on the best letter premiums, its
+    word multiplier can't be more than the best word premiums combined, and
+    its cross words can't score more than the rack's best tile would in
+    every cross word in the window.
+
+    @param x: The anchor's x coord on the line.
+    @param y: The index of the line.
+    @param rack: A list of the tiles available to play.
+    @param transposed: Whether the line is a column.
+
+    @returns: An integer."""
+
+    line = self._lines[transposed][y]
+    row = y * self.size
+    letter_table = self.layout.letter_mods[transposed]
+    word_table = self.layout.word_mods[transposed]
+    sums = self._cross_sums[transposed]
+    scores = self.language.scores
+    n = len(rack)
+
+    empties = []
+    if x > 0 and '.' != line[x-1]:
+      start = x - len(self.dawg.tokenize(self._get_prefix((x,y), transposed)))
+    else:
+      start = x - min(self._left_limits[transposed][y * self.size + x], max(n - 1, 0))
+      empties = range(start, x)
+
+    tiles = 0
+    for i in xrange(start, x):
+      if '.' != line[i]:
+        tiles += scores[line[i]]
+
+    # Walk right until the rack would run out, then take in any tiles that
+    # would be stuck to the end of the word.
+    i, placed = x, 0
+    while i < self.size and (placed < n or '.' != line[i]):
+      if '.' == line[i]:
+        empties.append(i)
+        placed += 1
+      else:
+        tiles += scores[line[i]]
+      i += 1
+
+    values = sorted((scores[t] for t in rack), reverse=True)
+    best = values[0] if values else 0
+
+    letter_mods, word_mods, cross = [], [], 0
+    for i in empties:
+      letter_mods.append(letter_table[row + i])
+      word_mods.append(word_table[row + i])
+      if sums[row + i] is not None:
+        cross += (sums[row + i] + best * letter_mods[-1]) * word_mods[-1]
+
+    letters = sum(v * m for v, m in zip(values, sorted(letter_mods, reverse=True)))
+
+    mod = 1
+    for m in sorted(word_mods, reverse=True)[:n]:
+      mod *= m
+
+    bingo = BINGO_BONUS if n >= 7 else 0
+    return (tiles + letters) * mod + cross + bingo
+
+  def _line_anchors(self, transposed):
+    """Returns the anchors in line coordinates, ordered line by line."""
+
+    anchors = self._cached_anchors[transposed]
+    if anchors is None:
+      anchors = sorted((self._coord(x, y, transposed) for x, y in self._anchors), key=lambda a: (a[1], a[0]))
+      self._cached_anchors[transposed] = anchors
+
+    return anchors
 
-      self._cached_anchors = []
-      for row in xrange(GRID_SIZE):
-        # Filter the list of squares on a row to those which are adjacent to a
-        # tile which is already on the board.
-        row_anchors = filter(lambda s: self._is_anchor(s, row), xrange(GRID_SIZE))
-        self._cached_anchors += zip(row_anchors,[row] * len(row_anchors))
+  def _cross_section(self, x, y, transposed):
+    """Returns the cross-section of a square across its line, i.e. the word
+    a tile placed there would form in the other direction.
 
-      self._anchors_dirty = False
+    @param x: The x coord on the line.
+    @param y: The index of the line.
+    @param transposed: Whether the line is a column.
 
-    return self._cached_anchors
+    @returns: A string like `cross_section' returns."""
+
+    # The square's cross-section runs along its line in the other direction.
+    line = self._lines[not transposed][x]
+
+    cross = "."
+    i = y - 1
+    while i >= 0 and '.' != line[i]:
+      cross = line[i] + cross
+      i -= 1
+
+    i = y + 1
+    while i < self.size and '.' != line[i]:
+      cross += line[i]
+      i += 1
+
+    return cross
+
+  def _compute_cross_check(self, x, y, transposed):
+    """Works out the cross-check of an empty square from scratch.
+
+    @param x: The x coord on the line.
+    @param y: The index of the line.
+    @param transposed: Whether the line is a column.
+
+    @returns: A bitmask of letters."""
+
+    cross = self._cross_section(x, y, transposed)
+    if '.' == cross:
+      return self._all_letters
+    return self.dawg.pivot_mask(cross)
+
+  def _update_cross_checks(self, squares):
+    """Recomputes the cross-checks that placing tiles can have changed, which
+    are those of the empty squares at either end of the words running through
+    the new tiles.
+
+    @param squares: A list of (x, y) tuples of the new tiles."""
+
+    dirty = set()
+    for square in squares:
+      for transposed in (False, True):
+        x, y = self._coord(square[0], square[1], transposed)
+
+        # The words across a line run along the lines of the other direction.
+        line = self._lines[not transposed][x]
+        for step in (-1, 1):
+          i = y
+          while 0 <= i < self.size and '.' != line[i]:
+            i += step
+          if 0 <= i < self.size:
+            dirty.add((x, i, transposed))
+
+    for x, y, transposed in dirty:
+      self._refresh_cross_check(x, y, transposed)
+
+  def _rebuild_cross_checks(self):
+    """Recomputes the cross-check and cross sum of every empty square."""
+
+    for transposed in (False, True):
+      line = self._lines[transposed]
+      for y in xrange(self.size):
+        for x in xrange(self.size):
+          if '.' == line[y][x]:
+            self._refresh_cross_check(x, y, transposed)
+
+  def _refresh_cross_check(self, x, y, transposed):
+    self._write(self._cross_checks[transposed], y * self.size + x, self._compute_cross_check(x, y, transposed))
+
+    cross = self._cross_section(x, y, transposed)
+    if '.' == cross:
+      self._write(self._cross_sums[transposed], y * self.size + x, None)
+    else:
+      self._write(self._cross_sums[transposed], y * self.size + x, sum(self.language.scores[c] for c in self.dawg.tokenize(cross) if '.' != c))
+
+  def _rebuild_anchors(self):
+    """Works out every anchor and left limit from scratch."""
+
+    # If the starting square hasn't been played it is necessarily the only anchor
+    if '.' == self.square(*self.layout.start):
+      self._anchors = set([self.layout.start])
+    else:
+      self._anchors = set((x, y) for y in xrange(self.size) for x in xrange(self.size) if self._is_anchor(x, y))
+
+    self._left_limits = {False: [0] * (self.size * self.size), True: [0] * (self.size * self.size)}
+    for i in xrange(self.size):
+      self._update_left_limits(i, False)
+      self._update_left_limits(i, True)
+
+    self._cached_anchors = {False: None, True: None}
+
+  def _update_anchors(self, squares):
+    """Updates the anchors and left limits around newly placed tiles.
+
+    @param squares: A list of (x, y) tuples of the new tiles."""
+
+    if self.layout.start in squares or '.' == self.square(*self.layout.start):
+      # Until the starting square is played it's the only anchor, and playing
+      # it replaces it with real ones.
+      return self._rebuild_anchors()
+
+    touched = set()
+    for x, y in squares:
+      for i, j in ((x, y), (x-1, y), (x+1, y), (x, y-1), (x, y+1)):
+        anchor = self._is_anchor(i, j)
+        if anchor != ((i, j) in self._anchors):
+          if self._journal is not None:
+            self._journal.append((None, (i, j), not anchor))
+          if anchor:
+            self._anchors.add((i, j))
+          else:
+            self._anchors.discard((i, j))
+        touched.add((i, j))
+
+    for line in set(y for x, y in touched if 0 <= y < self.size):
+      self._update_left_limits(line, False)
+    for line in set(x for x, y in touched if 0 <= x < self.size):
+      self._update_left_limits(line, True)
+
+    self._cached_anchors = {False: None, True: None}
+
+  def _update_left_limits(self, y, transposed):
+    """Recounts the left limits along a line.
+
+    @param y: The index of the line.
+    @param transposed: Whether the line is a column."""
+
+    line = self._lines[transposed][y]
+    limits = self._left_limits[transposed]
+    run = 0
+    for x in xrange(self.size):
+      if limits[y * self.size + x] != run:
+        self._write(limits, y * self.size + x, run)
+      if '.' == line[x] and self._coord(x, y, transposed) not in self._anchors:
+        run += 1
+      else:
+        run = 0
 
   def _place(self, letter, x, y):
     """Place a letter on the board.
@@ -216,7 +775,10 @@ class Board (object):
     @param y: The y coord."""
 
     if self._is_valid_place(letter, x, y): 
-      self.grid[y][x] = letter
+      if '.' == self.grid[y][x]:
+        self.hash ^= key('square', y * self.size + x, letter)
+      self._write(self.grid[y], x, letter)
+      self._write(self._columns[x], y, letter)
     else:
       raise BoardError("Illegal play [%d,%d]." % (x, y))
 
@@ -233,225 +795,343 @@ class Board (object):
     else:
       square = lambda j: (start[0], start[1]+j)
 
-    # First, check to make sure that each placement in the word is valid.
-    for i, letter in enumerate(word):
+    # First, check to make sure that each placement in the word is valid. A
+    # digraph takes up a single square.
+    tokens = self.dawg.tokenize(word)
+    for i, letter in enumerate(tokens):
       if not self._is_valid_place(letter, *square(i)):
         raise BoardError("Illegal play [%d,%d]." % (square(i)[0], square(i)[1]))
 
     score = self.score(word, start, end)
 
-    for i, letter in enumerate(word):
-      self._place(letter, *square(i))
+    # Updating the anchors from scratch swaps in new tables rather than
+    # writing to the old ones, so keep those around as well.
+    self._journal = []
+    anchors, limits, cached, old_hash = self._anchors, self._left_limits, self._cached_anchors, self.hash
+
+    placed = []
+    for i, letter in enumerate(tokens):
+      if '.' == self.grid[square(i)[1]][square(i)[0]]:
+        placed.append(square(i))
+        self._place(letter, *square(i))
+
+    self._update_cross_checks(placed)
+    self._update_anchors(placed)
+
+    if self._anchors is anchors:
+      anchors = limits = None
+    self._undo.append((self._journal, anchors, limits, cached, old_hash))
+    self._journal = None
 
     return score
 
-  def _is_anchor(self, x, y):
-    if x + 1 >= GRID_SIZE or x - 1 < 0 or \
-       y + 1 >= GRID_SIZE or y - 1 < 0:
-      return False
+  def undo(self):
+    """Takes back the last play, restoring the tiles, cross-checks and anchors
+    it changed."""
 
-    try:
-      if self.square(x, y) == '.' and \
-          (self.square(x-1, y) != '.' or \
-           self.square(x+1, y) != '.' or \
-           self.square(x, y+1) != '.' or \
-           self.square(x, y-1) != '.'):
-        return True
-    except IndexError: pass
-    return False
+    if not self._undo:
+      raise BoardError("There's no play to undo.")
 
-  def _get_bingo_bonus(self, word, iter):
-    count = 0
-    for i in xrange(len(word)):
-      if '.' == self.square(*iter(i)):
-        count += 1
+    journal, anchors, limits, cached, self.hash = self._undo.pop()
+    for table, index, old in reversed(journal):
+      if table is None:
+        if old:
+          self._anchors.add(index)
+        else:
+          self._anchors.discard(index)
+      else:
+        table[index] = old
 
-    if count == 7:
-      return 50
-    return 0
+    if anchors is not None:
+      self._anchors, self._left_limits = anchors, limits
+    self._cached_anchors = cached
 
-  def _get_word_cross_scores(self, word, iter):
-    """Returns the collective scores of all the cross words that were created
-    by playing word.
-    
-    @param word: A string of the word.
-    @param iter: A lambda function that takes one arg and returns the square 
-      of the word offset by the argument.
-      
-    @returns: An integer for the modifier."""
-
-    score = 0
-    for i in xrange(len(word)):
-      cross_section = self.cross_section(*iter(i))
-      if '.' == self.square(*iter(i)) and ('.' == cross_section[0] or '.' == cross_section[-1]):
-        score += reduce(lambda a, b: a + b, map(lambda c: self.language.scores[c], cross_section.replace('.', '')), 0)
+  def _write(self, table, index, value):
+    """Sets an entry of one of the board's tables, journaling the old value
+    if a play is being made."""
 
-    return score
+    if self._journal is not None:
+      self._journal.append((table, index, table[index]))
+    table[index] = value
 
-  def _get_word_score_mod(self, word, iter):
-    """Returns the total multiplier for a word.
-    
-    @param word: A string of the word.
-    @param iter: A lambda function that takes one arg and returns the square 
-      of the word offset by the argument.
-      
-    @returns: An integer for the modifier."""
+  def _is_anchor(self, x, y):
+    """Checks whether an empty square is next to a tile. Squares on the edge
+    of the board count too.
 
-    mod = 1
-    for i in xrange(len(word)):
-      (x,y) = iter(i)
-      if 'T' == SPECIAL[y][x] and '.' == self.square(x,y):
-        mod *= 3
-      elif 'D' == SPECIAL[y][x] and '.' == self.square(x,y):
-        mod *= 2
-    return mod
-
-  def _get_letter_score(self, letter, (x,y)):
-    """Returns a particular letter score.
-    
-    @param letter: The character to play.
     @param x: The x coord.
-    @param y: The y coord.
-    
-    @returns: An integer for the score."""
+    @param y: The y coord."""
 
-    if '.' == self.square(x, y):
-      if SPECIAL[y][x] == 'd':
-        return self.language.scores[letter] * 2
-      elif SPECIAL[y][x] == 't':
-        return self.language.scores[letter] * 3
-    return self.language.scores[letter]
+    if not (0 <= x < self.size and 0 <= y < self.size) or '.' != self.grid[y][x]:
+      return False
 
-  def _get_prefix(self, anchor):
+    return (x > 0 and '.' != self.grid[y][x-1]) or \
+           (x + 1 < self.size and '.' != self.grid[y][x+1]) or \
+           (y > 0 and '.' != self.grid[y-1][x]) or \
+           (y + 1 < self.size and '.' != self.grid[y+1][x])
+
+  def _get_prefix(self, (x,y), transposed):
     """Returns the string prefix of characters already on the board of a given
     square.
     
-    @param anchor: An (x, y) tuple to start looking for a prefix.
+    @param x: The x coord on the line to start looking for a prefix.
+    @param y: The index of the line.
+    @param transposed: Whether the line is a column.
     
     @returns: The prefix as a string."""
 
+    line = self._lines[transposed][y]
     prefix = ''
-    square = (anchor[0]-1, anchor[1])
-    s = self.square(*square)
-    while 1:
-      if '.' == s:
-        return prefix
-      prefix = s + prefix
-      square = (square[0]-1, square[1])
-      s = self.square(*square)
-
-  def _get_moves(self, anchor, rack):
-    """Gets all legal `across' moves at a given square with a given rack.
-
-    @param anchor: An (x, y) tuple to start looking for a prefix.
-    @param rack: A list of the tiles available to play.
-
-    @returns: A list of 3-tuple's in the following format...
-      (`word', start, end)"""
-
-    if '.' != self.square(anchor[0]-1, anchor[1]):
+    x -= 1
+    while x >= 0 and '.' != line[x]:
+      prefix = line[x] + prefix
+      x -= 1
+    return prefix
+
+  def _get_moves(self, anchor, rack, transposed, deadline=None):
+    """Gets all legal moves along a line at a given square with a given rack.
+
+    @param anchor: An (x, y) tuple, in line coordinates, to start looking for
+      a prefix.
+    @param rack: A list of tile counts, as `_rack_counts' returns.
+    @param transposed: Whether the line is a column.
+    @param deadline: A `time.time()' to give up at, if any, with the moves
+      found by then.
+
+    @returns: A list of 5-tuple's in the following format...
+      (`word', `tiles', start, end, score)"""
+
+    return list(self._iter_anchor_moves(anchor, rack, transposed, deadline))
+
+  def _iter_anchor_moves(self, anchor, rack, transposed, deadline=None):
+    """Like `_get_moves', but generates the moves as they're found. The rack
+    counts are only back the way they were once it's exhausted."""
+
+    # Which letters are on the rack, as a bitmask.
+    rack_mask = 0
+    for symbol in xrange(len(rack) - 1):
+      if rack[symbol]:
+        rack_mask |= 1 << symbol
+
+    # The letters and tiles of the word being built, one token per square,
+    # shared by the whole search from this anchor.
+    word = [None] * self.size
+    partial = [None] * self.size
+
+    x, y = anchor
+    if x > 0 and '.' != self._lines[transposed][y][x-1]:
       # If the left of the anchor is already on the board, use those tiles as
       # the prefix instead of trying to generate one.
-      prefix = self._get_prefix(anchor)
-      if self.dawg.node(prefix) is None:
+      prefix = self._get_prefix(anchor, transposed)
+      node = self.dawg.node(prefix)
+      if node is None:
         # Technically this should never happen as any word already on the board
         # would be a valid prefix--but you never know.
-        return []
+        return iter(())
       else:
-        return self._rright_part(self.dawg.node(prefix), prefix, rack, anchor, [], True)
-    else:
-      try:
-        # Get the index of the closest letter already on the board to the left 
-        # of the anchor.
-        nearest = max(zip(*filter(lambda n: n[0] < anchor[0] and n[1] == anchor[1], self.anchors()))[0]) + 1
-      except IndexError: nearest = 0
-
-      # Get the maximum length of the left side of the word.
-      limit = anchor[0] - nearest
-
-      return self._rleft_part(self.dawg.root, '', limit, rack, anchor, [])
-
-  def _already_played(self, move):
-    word, start, end = move[0], move[2], move[3]
-
-    if start[0] != end[0]:
-      iter = lambda j: (start[0]+j, start[1])
+        tokens = self.dawg.tokenize(prefix)
+        word[:len(tokens)] = partial[:len(tokens)] = tokens
+        points = sum(self.language.scores[t] for t in tokens)
+        return self._right_part(node, word, partial, rack, rack_mask, anchor, transposed, True, (points, 1, 0, 0), len(tokens), deadline)
     else:
-      iter = lambda j: (start[0], start[1]+j)
-
-    for i in xrange(len(word)):
-      if '.' == self.square(*iter(i)):
-        return False
-    return True
-
-  def _rright_part(self, node, partial, rack, (x,y), results, extended):
-    if x >= GRID_SIZE or x < 0 or \
-       y >= GRID_SIZE or y < 0:
-       return results
-
-    s = self.square(x, y)
-
-    if '.' == s:
-      # Check to see if a word as been formed at this point, and that the
-      # left side has actually been extended.
-      if node in self.dawg.accepts and '.' == s and extended:
-        move = (self.dawg.accepts[node], partial, (x-len(partial), y), (x-1, y))
-
-        # Make sure this isn't a word that's already on the board.
-        if not self._already_played(move):
-          results += [move]
-
-      xs = self.cross_set(x,y)
-
-      # Only allow if the letter from the rack is also in the cross-check
-      # of this square.
-      for e in self.dawg.graph[node]:
-        if e[0] in rack and e[0] in xs:
-          newrack = rack[:rack.index(e[0])] + rack[rack.index(e[0])+1:]
-          results = self._rright_part(e[1], partial + e[0], newrack, (x+1,y), results, True)
-
-      # If there's a blank in the rack, deal with that as well.
-      if '_' in rack:
-        for e in self.dawg.graph[node]:
-          if e[0] in xs:
-            newrack = rack[:rack.index('_')] + rack[rack.index('_')+1:]
-            results = self._rright_part(e[1], partial + '_', newrack, (x+1,y), results, True)
-
-    else:
-      # See if the letter already on the board can form a valid move(s).
-      for e in self.dawg.graph[node]:
-        if s == e[0]:
-          results = self._rright_part(e[1], partial + e[0], rack, (x+1,y), results, True)
-
-    return results
-
-  def _rleft_part(self, node, partial, limit, rack, anchor, results):
-    results = self._rright_part(node, partial, rack, anchor, results, False)
-
-    if limit > 0:
-      # If there's a blank in the rack, deal with that as well.
-      if '_' in rack:
-        for e in self.dawg.graph[node]:
-          newrack = rack[:rack.index('_')] + rack[rack.index('_')+1:]
-          self._rleft_part(e[1], partial + '_', limit - 1, newrack, anchor, results)
-
-      for e in self.dawg.graph[node]:
-        if e[0] in rack:
-          newrack = rack[:rack.index(e[0])] + rack[rack.index(e[0])+1:]
-          self._rleft_part(e[1], partial + e[0], limit - 1, newrack, anchor, results)
-
-    return results
+      # Get the maximum length of the left side of the word, which can run
+      # back as far as the previous anchor.
+      limit = self._left_limits[transposed][y * self.size + x]
+
+      return self._left_part(word, partial, limit, rack, rack_mask, anchor, transposed, deadline)
+
+  def _right_part(self, node, word, partial, rack, rack_mask, (x,y), transposed, extended, tally, length, deadline=None):
+    """Extends a word to the right from an anchor, scoring as it goes.
+
+    @param word: The letters of the word so far, followed by room for the
+      rest of it.
+    @param partial: The same, with blanks as `_'.
+    @param rack: The tile counts left, which are taken out while a subtree is
+      searched and put back afterwards.
+    @param rack_mask: The bitmask of the letters left on the rack.
+    @param tally: A (letters, multiplier, cross words, tiles used) tuple of
+      the score so far.
+    @param length: The number of squares the word covers so far.
+    @param deadline: A `time.time()' to give up at, if any. The clock is only
+      looked at every so often, and the rack is put back before giving up.
+
+    @returns: A generator of moves."""
+
+    d = self.dawg
+    masks, accepting, alphabet, child = d.masks, d.accepting, d.alphabet, d.child
+    tally_tile, values, size = self._tally, self._values, self.size
+    line = self._lines[transposed][y]
+    checks = self._cross_checks[transposed]
+    row = y * size
+
+    # A depth first search with an explicit stack. Each entry is a square to
+    # extend the word onto, along with the letter that was placed to get
+    # there and the rack symbol it was taken from (-1 for a blank, None for a
+    # tile on the board). A plain symbol on the stack means its subtree has
+    # been searched and the tile goes back on the rack.
+    stack = [(node, x, rack_mask, extended, tally, length, None, None)]
+    push, pop = stack.append, stack.pop
+    steps = 0
+    while stack:
+      entry = pop()
+      if entry.__class__ is int:
+        rack[entry] += 1
+        continue
+
+      if deadline is not None:
+        steps += 1
+        if not steps & 1023 and time.time() > deadline:
+          _put_back(rack, stack)
+          return
+
+      node, x, rack_mask, extended, tally, length, letter, taken = entry
+      if letter is not None:
+        word[length-1] = letter
+        partial[length-1] = '_' if -1 == taken else letter
+      if taken is not None:
+        rack[taken] -= 1
+        if taken >= 0 and not rack[taken]:
+          rack_mask ^= 1 << taken
+        push(taken)
+
+      if x < size:
+        s = line[x]
+      else:
+        s = None
+
+      if '.' == s or s is None:
+        # Check to see if a word as been formed at this point, that the left
+        # side has actually been extended, and that it isn't a word that's
+        # already on the board. A lone tile isn't a word along this line even
+        # if its letter is; whatever it makes across is found along the other.
+        points, mod, cross, used = tally
+        if extended and used and length > 1 and accepting[node]:
+          score = points * mod + cross
+          if used == 7:
+            score += BINGO_BONUS
+          yield (''.join(word[:length]), ''.join(partial[:length]), self._coord(x-length, y, transposed), self._coord(x-1, y, transposed), score)
 
-  def _coord(self, x, y):
-    if self._transposed:
+      if '.' == s:
+        # Only follow edges whose letter is also in the cross-check of this
+        # square, and, unless there's a blank to stand in for it, on the rack.
+        edges = masks[node] & checks[row + x]
+        if not rack[-1]:
+          edges &= rack_mask
+
+        # The edges are pushed last letter first, and a blank before the
+        # tile itself, so that they're searched in the same order as ever.
+        while edges:
+          symbol = edges.bit_length() - 1
+          bit = 1 << symbol
+          edges ^= bit
+
+          letter, target = alphabet[symbol], child(node, symbol)
+
+          # If there's a blank in the rack, deal with that as well.
+          if rack[-1]:
+            newtally = tally_tile(tally, values[-1], row + x, transposed)
+            push((target, x+1, rack_mask, True, newtally, length + 1, letter, -1))
+
+          if bit & rack_mask:
+            newtally = tally_tile(tally, values[symbol], row + x, transposed)
+            push((target, x+1, rack_mask, True, newtally, length + 1, letter, symbol))
+
+      elif s in d.symbols:
+        # See if the letter already on the board can form a valid move(s).
+        symbol = d.symbols[s]
+        target = child(node, symbol)
+        if target is not None:
+          points, mod, cross, used = tally
+          newtally = (points + values[symbol], mod, cross, used)
+          push((target, x+1, rack_mask, True, newtally, length + 1, s, None))
+
+  def _left_part(self, word, partial, limit, rack, rack_mask, anchor, transposed, deadline=None):
+    """Builds the part of a word to the left of an anchor, extending each
+    one to the right as it goes.
+
+    @param limit: How many squares the left part can take up.
+    @param deadline: As in `_right_part'.
+
+    @returns: A generator of moves."""
+
+    d = self.dawg
+    x, y = anchor
+    scores = self.language.scores
+    letter_mods = self.layout.letter_mods[transposed]
+    word_mods = self.layout.word_mods[transposed]
+    row = y * self.size
+
+    # The same kind of search as `_right_part', where each entry is a left
+    # part ending at the node.
+    stack = [(d.root, 0, rack_mask, None, None)]
+    while stack:
+      entry = stack.pop()
+      if entry.__class__ is int:
+        rack[entry] += 1
+        continue
+
+      node, length, rack_mask, letter, taken = entry
+      if letter is not None:
+        word[length-1] = letter
+        partial[length-1] = '_' if -1 == taken else letter
+        rack[taken] -= 1
+        if taken >= 0 and not rack[taken]:
+          rack_mask ^= 1 << taken
+        stack.append(taken)
+
+      # The left part runs up to the anchor. Its squares are never next to a
+      # tile so there are no cross words to score.
+      points, mod = 0, 1
+      for i in xrange(length):
+        index = row + x - length + i
+        points += scores[partial[i]] * letter_mods[index]
+        mod *= word_mods[index]
+
+      for move in self._right_part(node, word, partial, rack, rack_mask, anchor, transposed, False, (points, mod, 0, length), length, deadline):
+        yield move
+      if deadline is not None and time.time() > deadline:
+        _put_back(rack, stack)
+        return
+
+      if length < limit:
+        edges = d.masks[node]
+        if not rack[-1]:
+          edges &= rack_mask
+
+        while edges:
+          symbol = edges.bit_length() - 1
+          bit = 1 << symbol
+          edges ^= bit
+
+          letter, target = d.alphabet[symbol], d.child(node, symbol)
+
+          if bit & rack_mask:
+            stack.append((target, length + 1, rack_mask, letter, symbol))
+
+          # If there's a blank in the rack, deal with that as well.
+          if rack[-1]:
+            stack.append((target, length + 1, rack_mask, letter, -1))
+
+  def _tally(self, (points, mod, cross, used), value, index, transposed):
+    """Adds a tile from the rack placed on an empty square to a score tally.
+
+    @param value: The tile's value.
+    @param index: The square, as y * size + x in line coordinates.
+
+    @returns: The new (letters, multiplier, cross words, tiles used) tuple."""
+
+    value *= self.layout.letter_mods[transposed][index]
+    word_mod = self.layout.word_mods[transposed][index]
+
+    cross_sum = self._cross_sums[transposed][index]
+    if cross_sum is not None:
+      cross += (cross_sum + value) * word_mod
+
+    return (points + value, mod * word_mod, cross, used + 1)
+
+  def _coord(self, x, y, transposed):
+    """Converts between board and line coordinates, which is the same thing
+    both ways."""
+
+    if transposed:
       return (y, x)
     return (x, y)
-
-  def _get_transposed(self):
-    return self.__transposed
-
-  def _set_transposed(self, value):
-    self._anchors_dirty = True 
-    self.__transposed = value
-
-  _transposed = property(_get_transposed, _set_transposed)
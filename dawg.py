@@ -1,91 +1,415 @@
+from array import array
+
+# Typecodes of the compact tables a finished graph is stored in. Masks get a
+# bit per letter, so the alphabet can't be bigger than a machine long.
+MASK_TYPE = 'L'
+INDEX_TYPE = 'I'
+FLAG_TYPE = 'B'
+
+MASK_BITS = array(MASK_TYPE).itemsize * 8
+
+# The number of bits set in every 16 bit integer, which is how `child' counts
+# the edges before a letter's without making a string of every mask.
+_POPCOUNT = [0] * (1 << 16)
+for i in xrange(1, 1 << 16):
+  _POPCOUNT[i] = _POPCOUNT[i >> 1] + (i & 1)
+del i
+
+class DawgError (Exception):
+  pass
+
 class Dawg (object):
-  def __init__(self, digraphs=[]):
+  def __init__(self, digraphs=[], minimize=False):
+    """Creates an empty word graph.
+
+    While words are being inserted `graph' maps node ids to lists of
+    (letter, target) edges. Once the graph is finished it's compacted into
+    flat tables: letters are interned to small ints (`symbols'), each node
+    gets a bitmask of the letters it has edges for (`masks'), and the edge
+    targets of a node are stored contiguously in `targets' ordered by letter,
+    starting at `first[node]'.
+
+    @param digraphs: A list of two character tokens (e.g. `ch') that count as
+      a single letter.
+    @param minimize: If true, words must be inserted in sorted order and
+      equivalent suffixes are merged as they go, giving a minimal DAWG instead
+      of a plain trie. Call `finish' once the last word has been inserted."""
+
     self.root = self.index = 0
 
     self.digraphs = digraphs
+    self._digraph_set = frozenset(digraphs)
     self.graph = {self.root: []}
-    self.accepts = {}
+    self.accepts = set()
+
+    self.minimize = minimize
+    self.finished = False
+
+    # State for the incremental minimization: the previously inserted word,
+    # the (parent, letter, child) edges along its path which haven't been
+    # checked for an equivalent node yet, and the register of unique nodes.
+    self._previous = []
+    self._unchecked = []
+    self._register = {}
 
   def tokenize(self, word):
-    return self._rtokenize(word, [])
+    """Splits a word into its letters, with each digraph as one letter.
+
+    @param word: A string.
+
+    @returns: A list of tokens."""
+
+    if not self.digraphs:
+      return list(word)
+
+    # A single pass, looking each pair of characters up as it goes.
+    digraphs = self._digraph_set
+    tokens = []
+    i, n = 0, len(word)
+    while i < n:
+      pair = word[i:i+2]
+      if pair in digraphs:
+        tokens.append(pair)
+        i += 2
+      else:
+        tokens.append(word[i])
+        i += 1
+    return tokens
 
   def insert(self, word):
-    self._rinsert(self.root, self.tokenize(word), word)
+    if self.finished:
+      raise DawgError("Can't insert `%s' into a finished graph." % word)
+
+    if self.minimize:
+      self._minsert(self.tokenize(word))
+    else:
+      self._insert(self.tokenize(word))
+
+  def load(self, words):
+    """Inserts all of the words from an iterable, sorting them first if the
+    graph is being minimized, then finishes the graph.
+
+    @param words: An iterable of strings."""
+
+    if self.minimize:
+      self.load_tokens(sorted(self.tokenize(w) for w in words))
+    else:
+      self.load_tokens(self.tokenize(w) for w in words)
+
+  def load_tokens(self, words):
+    """Like `load', but for words that have been tokenized already. When
+    minimizing they have to be in sorted order, and since nothing is sorted
+    here they're inserted as they're read, e.g. straight from a generator.
+
+    @param words: An iterable of lists of tokens."""
+
+    if self.finished:
+      raise DawgError("Can't insert into a finished graph.")
+
+    if self.minimize:
+      for tokens in words:
+        self._minsert(tokens)
+    else:
+      for tokens in words:
+        self._insert(tokens)
+
+    self.finish()
+
+  def finish(self):
+    """Merges whatever is left of the last inserted word's path and compacts
+    the graph. No more words can be inserted afterwards."""
+
+    if self.minimize:
+      self._minimize(0)
+      self._register = self._previous = None
+    self._freeze()
+    self.finished = True
 
   def words(self):
-    return self.accepts.values()
+    self._check_finished()
+    return list(self.iter_words())
+
+  def iter_words(self):
+    """Generates the words in the graph in order, without collecting them.
+
+    @returns: A generator of strings."""
+
+    self._check_finished()
+
+    # A depth first walk with an explicit stack. Each entry is a node, its
+    # depth and the letter of the edge into it; the letters along the current
+    # path are kept in `path'.
+    path = []
+    stack = [(self.root, 0, None)]
+    while stack:
+      node, depth, letter = stack.pop()
+      if letter is not None:
+        del path[depth - 1:]
+        path.append(letter)
+
+      if self.accepting[node]:
+        yield ''.join(path)
+
+      edges = self.graph[node]
+      for letter, target in reversed(edges):
+        stack.append((target, depth + 1, letter))
 
   def node(self, word):
-    return self._rnode(self.root, self.tokenize(word))
+    self._check_finished()
+    return self._node(self.tokenize(word))
+
+  def child(self, node, symbol):
+    """Follows the edge for a letter out of a node.
+
+    @param node: The node id.
+    @param symbol: The interned letter (an index into `alphabet').
+
+    @returns: The target node, or None if there is no such edge."""
+
+    mask = self.masks[node]
+    bit = 1 << symbol
+    if not mask & bit:
+      return None
+
+    # The edges are stored in symbol order, so the letter's is after one for
+    # every lower bit that's set.
+    below = mask & (bit - 1)
+    rank = _POPCOUNT[below & 0xffff]
+    while below > 0xffff:
+      below >>= 16
+      rank += _POPCOUNT[below & 0xffff]
+    return self.targets[self.first[node] + rank]
+
+  def mask(self, letters):
+    """Returns the bitmask of some letters, ignoring any that aren't in the
+    graph's alphabet.
+
+    @param letters: An iterable of letters (tokens).
+
+    @returns: An integer with the bit of each letter's symbol set."""
+
+    mask = 0
+    for l in letters:
+      if l in self.symbols:
+        mask |= 1 << self.symbols[l]
+    return mask
+
+  def letters(self, mask):
+    """The inverse of `mask'.
+
+    @param mask: A bitmask of symbols.
+
+    @returns: A list of letters (tokens)."""
+
+    return [l for i, l in enumerate(self.alphabet) if mask & (1 << i)]
 
   def pivot_search(self, substring):
-    results = []
+    return self.letters(self.pivot_mask(substring))
 
+  def pivot_mask(self, substring):
+    """Like `pivot_search', but returns the letters that can take the place
+    of the `.' as a bitmask.
+
+    @param substring: A string with a single `.' in it (e.g. `sam.le').
+
+    @returns: A bitmask of symbols."""
+
+    self._check_finished()
     tokens = self.tokenize(substring)
 
     # Check if this node is the start of the substring.
     pivot = tokens.index('.')
-    matches = self._rmatch_string(self.root, self.tokenize(substring), [])
+    if any(t != '.' and t not in self.symbols for t in tokens):
+      return 0
 
-    for m in matches:
-      results += [self.tokenize(m)[pivot]]
+    symbols = [None if t == '.' else self.symbols[t] for t in tokens]
+    return self._match_string(symbols, pivot)
 
-    return results
+  def _check_finished(self):
+    if not self.finished:
+      raise DawgError("The graph has to be finished before it's searched.")
 
-  def _rtokenize(self, word, tokens):
-    if len(word) == 0:
-      return tokens
+  def _insert(self, tokens):
+    node = self.root
+    for letter in tokens:
+      for l, target in self.graph[node]:
+        if l == letter:
+          # If this edge already exists in the graph, follow it
+          node = target
+          break
+      else:
+        # If the edge doesn't already exist in the graph, create the edge
+        self.index += 1
+        self.graph[node].append((letter, self.index))
+        self.graph[self.index] = []
+        node = self.index
+
+    # Set this node to an accepting node once the whole word is inserted.
+    self.accepts.add(node)
+
+  def _minsert(self, tokens):
+    """Inserts a tokenized word using incremental construction from sorted
+    input (Daciuk et al.)."""
 
-    digraph = [dg for dg in self.digraphs if word.startswith(dg)]
+    if tokens <= self._previous:
+      if tokens == self._previous:
+        return
+      raise DawgError("Words must be inserted in sorted order when minimizing.")
 
-    if len(digraph) > 0:
-      return self._rtokenize(word[2:], tokens + [digraph[0]])
+    common = 0
+    for a, b in zip(tokens, self._previous):
+      if a != b:
+        break
+      common += 1
+
+    # Everything below the shared prefix is final now, so merge it.
+    self._minimize(common)
+
+    if self._unchecked:
+      node = self._unchecked[-1][2]
     else:
-      return self._rtokenize(word[1:], tokens + [word[0]])
+      node = self.root
 
-  def _rinsert(self, node, word, orig):
-    try:
-      # Unzip the edge values (letters) and the edge indices (targets).
-      if len(self.graph[node]) > 0:
-        letters, targets = map(lambda x: list(x), zip(*self.graph[node]))
-      else:
-        letters = targets = []
+    for letter in tokens[common:]:
+      self.index += 1
+      self.graph[node].append((letter, self.index))
+      self.graph[self.index] = []
+      self._unchecked.append((node, letter, self.index))
+      node = self.index
+
+    self.accepts.add(node)
+    self._previous = tokens
+
+  def _minimize(self, down_to):
+    while len(self._unchecked) > down_to:
+      parent, letter, child = self._unchecked.pop()
+      signature = (child in self.accepts, tuple(self.graph[child]))
 
-      if word[0] in letters:
-        # If this edge already exists in the graph, recurse to it's target
-        self._rinsert(targets[letters.index(word[0])], word[1:], orig)
+      if signature in self._register:
+        # An equivalent node already exists, so point the parent at that one
+        # and throw this copy away.
+        self.graph[parent][-1] = (letter, self._register[signature])
+        del self.graph[child]
+        self.accepts.discard(child)
       else:
-        # If the edge doesn't already exist in the graph, create the edge
-        self.index += 1
-        self.graph[node].append((word[0],self.index))
-        self.graph[self.index] = []
+        self._register[signature] = child
+
+  def _freeze(self):
+    """Compacts the edge lists into the flat tables."""
+
+    graph, accepts = self.graph, self.accepts
+
+    # Renumber the nodes so they're contiguous, starting with the root.
+    order = [self.root]
+    ids = {self.root: 0}
+    for node in order:
+      for letter, target in graph[node]:
+        if target not in ids:
+          ids[target] = len(order)
+          order.append(target)
 
-        # Move to the next letter
-        self._rinsert(self.index, word[1:], orig)
-    except IndexError:
-      # Set this node to an accepting node once the whole word is inserted.
-      if node not in self.accepts:
-        self.accepts[node] = orig
+    alphabet = sorted(set(e[0] for node in order for e in graph[node]))
+    if len(alphabet) > MASK_BITS:
+      raise DawgError("Too many letters for a %d bit mask (%d)." % (MASK_BITS, len(alphabet)))
+
+    self.alphabet = alphabet
+    self.symbols = dict((l, i) for i, l in enumerate(alphabet))
+
+    self.masks = array(MASK_TYPE)
+    self.first = array(INDEX_TYPE)
+    self.targets = array(INDEX_TYPE)
+    self.accepting = array(FLAG_TYPE)
+
+    for node in order:
+      edges = sorted((self.symbols[l], ids[t]) for l, t in graph[node])
+      mask = 0
+      for symbol, target in edges:
+        mask |= 1 << symbol
+      self.masks.append(mask)
+      self.first.append(len(self.targets))
+      self.targets.extend(t for s, t in edges)
+      self.accepting.append(node in accepts)
+
+    self.root = self.index = 0
+    self.graph = Edges(self)
+    self.accepts = Accepts(self)
 
-  def _rmatch_string(self, node, tokens, results):
-    if len(tokens) == 0:
-      if node in self.accepts:
-        results += [self.accepts[node]]
-      return results
+  def _match_string(self, symbols, pivot):
+    """Returns the mask of the letters at the pivot of every word matching
+    the symbols, where the pivot is None and matches any letter."""
 
-    letter = tokens[0]
-    for e in self.graph[node]:
-      if letter == e[0] or '.' == letter:
-        results = self._rmatch_string(e[1], tokens[1:], results)
+    # Follow the symbols up to the pivot, which is a single path.
+    node = self._node(self.alphabet[s] for s in symbols[:pivot])
+    if node is None:
+      return 0
+
+    # Then try each letter at the pivot and follow the rest of the symbols
+    # from there.
+    results = 0
+    mask = self.masks[node]
+    edge = self.first[node]
+    while mask:
+      low = mask & -mask
+      target = self.targets[edge]
+      for symbol in symbols[pivot + 1:]:
+        target = self.child(target, symbol)
+        if target is None:
+          break
+      else:
+        if self.accepting[target]:
+          results |= low
+      mask ^= low
+      edge += 1
 
     return results
 
-  def _rnode(self, node, word):
-    if len(word) == 0:
-      return node
+  def _node(self, word):
+    node = self.root
+    for letter in word:
+      if letter not in self.symbols:
+        return None
+      node = self.child(node, self.symbols[letter])
+      if node is None:
+        return None
+    return node
+
+class Edges (object):
+  """A read-only view of a finished graph's edges, mapping node ids to lists
+  of (letter, target) tuples the way `Dawg.graph' does while building."""
+
+  def __init__(self, dawg):
+    self.dawg = dawg
+
+  def __len__(self):
+    return len(self.dawg.masks)
+
+  def __contains__(self, node):
+    return 0 <= node < len(self)
+
+  def __iter__(self):
+    return iter(xrange(len(self)))
+
+  def __getitem__(self, node):
+    if node not in self:
+      raise KeyError(node)
+
+    d = self.dawg
+    mask = d.masks[node]
+    edge = d.first[node]
+    edges = []
+    while mask:
+      low = mask & -mask
+      edges.append((d.alphabet[low.bit_length() - 1], d.targets[edge]))
+      mask ^= low
+      edge += 1
+    return edges
+
+class Accepts (object):
+  """A read-only view of a finished graph's accepting nodes, like the set
+  `Dawg.accepts' is while building."""
 
-    for n in self.graph[node]:
-      if n[0] == word[0]:
-        return self._rnode(n[1], word[1:])
-    return None
+  def __init__(self, dawg):
+    self.dawg = dawg
 
+  def __contains__(self, node):
+    return node is not None and 0 <= node < len(self.dawg.accepting) and bool(self.dawg.accepting[node])
@@ -0,0 +1,81 @@
+from itertools import imap
+from multiprocessing import Pool, cpu_count
+from multiprocessing.pool import ThreadPool
+
+# Executors run a function over a list of independent tasks and return the
+# results in the same order as the tasks, like the builtin `map', or yield
+# them in that order as they're ready, like `itertools.imap'. The search
+# hands them its rollouts and candidate subtrees, so swapping one executor for
+# another changes how the work is spread out but never the results.
+#
+# Tasks sent to a ProcessExecutor are pickled, so the function has to be
+# defined at the top level of a module. Boards pickle as just their tiles and
+# shared lexicons as their path (see `Board.__getstate__' and
+# `lexicon.shared'), so every worker maps the word graph once instead of
+# receiving a copy of it with each task.
+
+class SerialExecutor (object):
+  """Runs every task in the calling thread."""
+
+  def map(self, func, tasks):
+    return map(func, tasks)
+
+  def imap(self, func, tasks):
+    return imap(func, tasks)
+
+  def close(self):
+    pass
+
+class ThreadExecutor (object):
+  """Runs tasks on a pool of threads."""
+
+  def __init__(self, workers=None):
+    """@param workers: The number of threads, defaults to the number of
+      CPUs."""
+
+    self.pool = ThreadPool(workers or cpu_count())
+
+  def map(self, func, tasks):
+    return self.pool.map(func, tasks)
+
+  def imap(self, func, tasks):
+    return self.pool.imap(func, tasks)
+
+  def close(self):
+    self.pool.close()
+    self.pool.join()
+
+class ProcessExecutor (object):
+  """Runs tasks on a pool of worker processes."""
+
+  def __init__(self, workers=None):
+    """@param workers: The number of processes, defaults to the number of
+      CPUs."""
+
+    self.pool = Pool(workers or cpu_count())
+
+  def map(self, func, tasks):
+    return self.pool.map(func, tasks, 1)
+
+  def imap(self, func, tasks):
+    return self.pool.imap(func, tasks)
+
+  def close(self):
+    self.pool.close()
+    self.pool.join()
+
+SERIAL = SerialExecutor()
+
+EXECUTORS = {'serial': SerialExecutor, 'thread': ThreadExecutor, 'process': ProcessExecutor}
+
+def create(kind='serial', workers=None):
+  """Creates an executor by name.
+
+  @param kind: One of `serial', `thread' or `process'.
+  @param workers: The pool size, ignored for `serial'.
+
+  @returns: An executor."""
+
+  if kind == 'serial':
+    return SERIAL
+  return EXECUTORS[kind](workers)
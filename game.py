@@ -5,9 +5,12 @@ class GameError (Exception):
   pass
 
 class Game:
-  def __init__(self):
-    self.bag = Bag()
-    self.board = Board()
+  def __init__(self, language=en):
+    """@param language: A language class from `bag'."""
+
+    self.language = language
+    self.bag = Bag(language)
+    self.board = Board(language)
 
   def __repr__(self):
     # TODO: Output something a little more interesting.
@@ -23,7 +26,7 @@ class Game:
 
   def play(self, word, start, end):
     try:
-      self.board.play(word, start, end)
+      return self.board.play(word, start, end)
       
     except BoardError, e:
       # TODO: Do something useful with this.
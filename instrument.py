@@ -0,0 +1,164 @@
+import logging
+import threading
+from timeit import default_timer as clock
+
+# The methods that are timed and counted while instrumentation is enabled:
+# (module, class, method, probe name, what to count in its result). Each probe
+# records how many times it was called and the seconds spent in it, which
+# include the time spent in any probes below it.
+#
+# They're all on the paths move generation and the search actually take:
+# `lexicon.child' is every edge followed while generating moves, which makes
+# it by far the most called, and the one whose timing the probes themselves
+# skew the most.
+PROBES = [
+  ('dawg', 'Dawg', 'node', 'lexicon.node', None),
+  ('dawg', 'Dawg', 'child', 'lexicon.child', None),
+  ('dawg', 'Dawg', 'pivot_mask', 'lexicon.pivot_mask', None),
+  ('board', 'Board', '_compute_cross_check', 'board.cross_check', None),
+  ('board', 'Board', '_line_anchors', 'board.anchors', None),
+  ('board', 'Board', '_get_moves', 'board.anchor', lambda ms: {'board.moves_generated': len(ms)}),
+  ('board', 'Board', 'moves', 'board.moves', None),
+  ('board', 'Board', 'top_moves', 'board.top_moves', None),
+  ('board', 'Board', 'score', 'board.score', None),
+  ('board', 'Board', 'play', 'board.play', None),
+  ('board', 'Board', 'undo', 'board.undo', None),
+  ('board', 'Board', '__copy__', 'board.copy', None),
+  ('player', 'Player', '_count_node', 'search.node', None),
+  ('player', 'Player', '_average_random', 'search.rollouts', None),
+  ('player', 'Player', '_best_move', 'search.best_move', None),
+  ('transposition', 'TranspositionTable', 'get', 'table.get',
+    lambda value: {value is None and 'table.miss' or 'table.hit': 1}),
+]
+
+class Stats (object):
+  """Counters and timers collected while instrumentation is enabled."""
+
+  def __init__(self, hooks=None):
+    """@param hooks: A list of callables, each called with an event dict
+      (the probe's `name', the `seconds' the call took and anything it
+      counted) after every probed call."""
+
+    self.calls = {}
+    self.seconds = {}
+    self.counters = {}
+    self.hooks = list(hooks or [])
+
+    self._lock = threading.Lock()
+
+  def record(self, name, seconds, counts=None):
+    """Records a call of a probe.
+
+    @param name: The probe's name.
+    @param seconds: How long the call took.
+    @param counts: A dict of counter names to how much to add to them."""
+
+    with self._lock:
+      self.calls[name] = self.calls.get(name, 0) + 1
+      self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+      if counts:
+        for counter, n in counts.iteritems():
+          self.counters[counter] = self.counters.get(counter, 0) + n
+
+    if self.hooks:
+      event = dict(counts or {}, name=name, seconds=seconds)
+      for hook in self.hooks:
+        hook(event)
+
+  def reset(self):
+    with self._lock:
+      self.calls.clear()
+      self.seconds.clear()
+      self.counters.clear()
+
+  def as_dict(self):
+    """Returns everything recorded so far as a flat dict, e.g.
+    {'board.score.calls': 12, 'board.score.seconds': 0.002, ...}, for
+    metrics pipelines."""
+
+    with self._lock:
+      result = dict(self.counters)
+      for name in self.calls:
+        result[name + '.calls'] = self.calls[name]
+        result[name + '.seconds'] = self.seconds[name]
+    return result
+
+# The stats being recorded to and the original methods the probes replaced,
+# while instrumentation is enabled.
+_stats = None
+_originals = []
+
+def enable(hooks=None):
+  """Starts instrumenting the probed methods. Nothing is wrapped until this
+  is called, so instrumentation costs nothing while it's disabled. Only this
+  process is instrumented, not the workers of a process executor.
+
+  @param hooks: Callables to pass every event to (see `Stats').
+
+  @returns: The Stats being recorded to. If instrumentation is already
+    enabled the hooks are added to the current ones."""
+
+  global _stats
+
+  if _stats is not None:
+    _stats.hooks.extend(hooks or [])
+    return _stats
+
+  _stats = Stats(hooks)
+  for module, klass, method, name, count in PROBES:
+    klass = getattr(__import__(module), klass)
+    original = klass.__dict__[method]
+    _originals.append((klass, method, original))
+    setattr(klass, method, _probe(_stats, name, original, count))
+  return _stats
+
+def disable():
+  """Puts the original methods back.
+
+  @returns: The Stats that were recorded to, or None if instrumentation
+    wasn't enabled."""
+
+  global _stats
+
+  while _originals:
+    klass, method, original = _originals.pop()
+    setattr(klass, method, original)
+
+  stats, _stats = _stats, None
+  return stats
+
+def stats():
+  """Returns the Stats being recorded to, or None if instrumentation is
+  disabled."""
+
+  return _stats
+
+def log_hook(logger=None, level=logging.DEBUG):
+  """Makes a hook that logs every event, with the event's fields available
+  to formatters and handlers as attributes of the record (`probe',
+  `seconds' and any counters).
+
+  @param logger: The logger to use, `babel' by default.
+  @param level: The level to log at.
+
+  @returns: A hook for `enable'."""
+
+  logger = logger or logging.getLogger('babel')
+
+  def hook(event):
+    if logger.isEnabledFor(level):
+      extra = dict((k.replace('.', '_'), v) for k, v in event.iteritems() if k != 'name')
+      extra['probe'] = event['name']
+      logger.log(level, "%s %.6f", event['name'], event['seconds'], extra=extra)
+  return hook
+
+def _probe(stats, name, method, count):
+  def probe(*args, **kwargs):
+    start = clock()
+    result = method(*args, **kwargs)
+    stats.record(name, clock() - start, count and count(result))
+    return result
+
+  probe.__name__ = method.__name__
+  probe.__doc__ = method.__doc__
+  return probe
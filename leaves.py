@@ -0,0 +1,189 @@
+import codecs
+import os
+import sys
+from random import Random
+
+import bag
+from bag import Bag
+from board import Board
+from executor import SERIAL, create
+
+# Leave tables are built from this many self-played games by default.
+SELF_PLAY_GAMES = 200
+
+# Leaves seen fewer times than this are left out of the table, and valued as
+# the sum of their tiles instead.
+MIN_SAMPLES = 5
+
+def leave(board, rack, move):
+  """Works out which tiles of a rack a move would leave on it.
+
+  @param board: The board the move is to be played on.
+  @param rack: A string (or list) of the letters on the rack.
+  @param move: A (word, tiles, start, end, score) tuple from `Board.moves'.
+
+  @returns: A list of the tiles left."""
+
+  word, tiles, start, end = move[:4]
+  left = board._tokenize_rack(rack)
+
+  if start[0] != end[0]:
+    square = lambda j: (start[0]+j, start[1])
+  else:
+    square = lambda j: (start[0], start[1]+j)
+
+  # Only the tiles that go on empty squares come off the rack.
+  for i, tile in enumerate(board.dawg.tokenize(tiles)):
+    x, y = square(i)
+    if '.' == board.grid[y][x] and tile in left:
+      left.remove(tile)
+  return left
+
+def path_for(language):
+  """Returns where the leave table of a language lives, next to its
+  dictionary (`en.leaves' for `en.txt').
+
+  @param language: A language class from `bag'.
+
+  @returns: The path of the table."""
+
+  return os.path.splitext(language.dictionary)[0] + '.leaves'
+
+class LeaveTable (object):
+  """How much keeping a set of tiles on the rack is worth, in points, as
+  learned from self-play. A leave is worth how much better (or worse) the
+  next turn after keeping it scored than the average turn did."""
+
+  def __init__(self, values=None):
+    """@param values: A dict of sorted tuples of tiles to values."""
+
+    self.values = values or {}
+
+  def value(self, leave):
+    """Returns the value of keeping some tiles. Leaves that aren't in the
+    table are worth the sum of their tiles.
+
+    @param leave: An iterable of tiles.
+
+    @returns: The value in points."""
+
+    key = tuple(sorted(leave))
+    try:
+      return self.values[key]
+    except KeyError:
+      return sum(self.values.get((tile,), 0.0) for tile in key)
+
+  def save(self, path):
+    """Writes the table out as UTF-8 text, a line per leave: its value, a tab
+    and its tiles separated by spaces."""
+
+    f = codecs.open(path, 'w', 'UTF-8')
+    try:
+      for key, value in sorted(self.values.iteritems()):
+        f.write(u'%.2f\t%s\n' % (value, u' '.join(key)))
+    finally:
+      f.close()
+
+  @classmethod
+  def load(klass, path):
+    values = {}
+    f = codecs.open(path, 'r', 'UTF-8')
+    try:
+      for line in f:
+        value, tiles = line.rstrip(u'\n').split(u'\t')
+        values[tuple(tiles.split())] = float(value)
+    finally:
+      f.close()
+    return klass(values)
+
+def build(language, games=SELF_PLAY_GAMES, seed=0, executor=SERIAL, min_samples=MIN_SAMPLES):
+  """Learns a leave table by having a greedy player play against itself.
+
+  @param language: A language class from `bag'.
+  @param games: How many games to play.
+  @param seed: Seeds the games, each of which gets its own seed from it.
+  @param executor: What to play the games on (see `executor').
+  @param min_samples: How many times a leave has to be seen to get its own
+    entry.
+
+  @returns: A LeaveTable."""
+
+  rng = Random(seed)
+  tasks = [(language, rng.getrandbits(32)) for i in xrange(games)]
+
+  samples = []
+  for game in executor.map(_self_play, tasks):
+    samples += game
+  if not samples:
+    return LeaveTable()
+
+  average = float(sum(score for key, score in samples)) / len(samples)
+
+  totals = {}
+  for key, score in samples:
+    total, count = totals.get(key, (0, 0))
+    totals[key] = (total + score, count + 1)
+
+  values = {}
+  for key, (total, count) in totals.iteritems():
+    if count >= min_samples:
+      values[key] = float(total) / count - average
+  return LeaveTable(values)
+
+def _self_play(task):
+  # Plays a game of highest scoring moves and returns a (leave, score of the
+  # next turn) tuple for every leave kept while there were tiles to draw.
+  language, seed = task
+  rng = Random(seed)
+  board, tiles = Board(language), Bag(language)
+
+  racks = [[], []]
+  kept = [None, None]
+  samples = []
+
+  turn = passes = 0
+  while passes < 2:
+    player = turn % 2
+    rack = racks[player]
+    rack += tiles.draw_rack(7 - len(rack), rng)
+    if not rack:
+      break
+
+    ms = board.top_moves(rack, 1)
+    score = ms and ms[0][4] or 0
+    if kept[player] is not None:
+      samples.append((kept[player], score))
+
+    if ms:
+      racks[player] = leave(board, rack, ms[0])
+      board.play(ms[0][0], ms[0][2], ms[0][3])
+      passes = 0
+    else:
+      passes += 1
+
+    # What's kept once the bag is empty is about to be stuck with, which
+    # isn't what the table is for.
+    if ms and tiles.remaining():
+      kept[player] = tuple(sorted(racks[player]))
+    else:
+      kept[player] = None
+
+    turn += 1
+
+  return samples
+
+if __name__ == '__main__':
+  # Builds the leave table of a language from self-play, e.g.
+  #   python leaves.py en 500
+  name = sys.argv[1] if len(sys.argv) > 1 else 'en'
+  games = int(sys.argv[2]) if len(sys.argv) > 2 else SELF_PLAY_GAMES
+  language = getattr(bag, name)
+
+  print "Playing %d games of %s..." % (games, name)
+  pool = create('process')
+  try:
+    table = build(language, games, executor=pool)
+  finally:
+    pool.close()
+  table.save(path_for(language))
+  print "%d leaves written to %s" % (len(table.values), path_for(language))
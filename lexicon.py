@@ -0,0 +1,241 @@
+import ctypes
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+
+from dawg import Dawg, DawgError, Edges, Accepts, MASK_TYPE, INDEX_TYPE, FLAG_TYPE
+import bag
+
+# Compiled lexicons are the tables of a finished `Dawg' written out as is, in
+# native byte order:
+#
+#   header    magic, version, byte order mark, size of a mask, node count,
+#             edge count, alphabet size and the size of the digraph table
+#   alphabet  the graph's letters, UTF-8 encoded and separated by newlines
+#   digraphs  the tokenizer's digraphs, encoded the same way
+#   masks     per node, the bitmask of letters it has edges for
+#   first     per node, the index of its first edge target
+#   targets   the edge targets of every node, ordered by letter
+#   accepting per node, whether a word ends there
+#
+# Each table starts on an 8 byte boundary and the root is always node 0.
+MAGIC = 'BABL'
+VERSION = 2
+BYTE_ORDER = 0x01020304
+
+HEADER = struct.Struct('=4sIIIIIII')
+
+# The ctypes equivalents of the tables' typecodes, used to view them in place.
+CTYPES = {MASK_TYPE: ctypes.c_ulong, INDEX_TYPE: ctypes.c_uint, FLAG_TYPE: ctypes.c_ubyte}
+TABLES = [('masks', MASK_TYPE), ('first', INDEX_TYPE), ('targets', INDEX_TYPE), ('accepting', FLAG_TYPE)]
+
+# Every lexicon loaded by this process, keyed by (language, dictionary), and
+# the ones unpickled from other processes, keyed by path.
+_registry = {}
+_mapped = {}
+_registry_lock = threading.Lock()
+
+def get(language, dictionary=None):
+  """Returns the shared lexicon for a language, loading it the first time
+  it's asked for. Every caller gets the same read-only instance.
+
+  @param language: A language class from `bag'.
+  @param dictionary: The word list to use instead of `language.dictionary'.
+
+  @returns: A `MappedDawg'."""
+
+  key = (language, dictionary or language.dictionary)
+  try:
+    return _registry[key]
+  except KeyError:
+    pass
+
+  with _registry_lock:
+    if key not in _registry:
+      _registry[key] = open_language(language, dictionary)
+    return _registry[key]
+
+def clear():
+  """Forgets every lexicon loaded so far, e.g. after recompiling one."""
+
+  with _registry_lock:
+    _registry.clear()
+    _mapped.clear()
+
+def path_for(language, dictionary=None):
+  """Returns where the compiled lexicon of a language lives.
+
+  @param language: A language class from `bag'.
+  @param dictionary: The word list to use instead of `language.dictionary'.
+
+  @returns: The path of the compiled file, next to the dictionary."""
+
+  return os.path.splitext(dictionary or language.dictionary)[0] + '.dawg'
+
+def build(language, path=None, dictionary=None):
+  """Builds a minimized graph from a language's dictionary and compiles it.
+
+  @param language: A language class from `bag'.
+  @param path: Where to write the file, defaults to `path_for(language)'.
+  @param dictionary: The word list to use instead of `language.dictionary'.
+
+  @returns: The path of the compiled file."""
+
+  dictionary = dictionary or language.dictionary
+  if path is None:
+    path = path_for(language, dictionary)
+
+  dawg = Dawg(digraphs=[k for k in language.scores.keys() if len(k) > 1], minimize=True)
+  words = (language.normalize(unicode(line.strip(), 'UTF-8')) for line in open(dictionary))
+
+  # Every word is tokenized once, and anything that can't be spelled with the
+  # language's tiles left out. The graph takes the tokens in token order,
+  # which isn't the dictionary's order once digraphs are involved.
+  tokenized = (dawg.tokenize(w) for w in words)
+  dawg.load_tokens(sorted(t for t in tokenized if all(l in language.scores for l in t)))
+
+  write(dawg, path)
+  return path
+
+def write(dawg, path):
+  """Writes a graph out in the compiled format.
+
+  @param dawg: A finished `Dawg'.
+  @param path: The file to write. It's replaced atomically so that readers
+    never see a partial file."""
+
+  if not dawg.finished:
+    raise DawgError("Only finished graphs can be compiled.")
+
+  letters = u'\n'.join(dawg.alphabet).encode('UTF-8')
+  digraphs = u'\n'.join(dawg.digraphs).encode('UTF-8')
+
+  tmp = '%s.%d.tmp' % (path, os.getpid())
+  f = open(tmp, 'wb')
+  try:
+    f.write(_header(len(dawg.masks), len(dawg.targets), len(letters), len(digraphs)))
+    f.write(letters)
+    f.write(digraphs)
+    for name, typecode in TABLES:
+      f.write('\0' * (-f.tell() % 8))
+      f.write(array(typecode, getattr(dawg, name)).tostring())
+  finally:
+    f.close()
+  os.rename(tmp, path)
+
+def load(path):
+  """Memory maps a compiled lexicon. The pages are shared read-only with
+  every other Board and process that maps the same file.
+
+  @param path: The compiled file.
+
+  @returns: A `MappedDawg'."""
+
+  f = open(path, 'rb')
+  try:
+    # A private mapping lets ctypes view the tables in place. Nothing ever
+    # writes to them so the pages stay shared.
+    buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+  finally:
+    f.close()
+  return MappedDawg(buf, path)
+
+def shared(path):
+  """Returns this process' mapping of a compiled lexicon, loading it the
+  first time. This is how a `MappedDawg' is unpickled, so that boards sent to
+  worker processes share one mapping per worker instead of each carrying a
+  copy of the graph.
+
+  @param path: The compiled file.
+
+  @returns: A `MappedDawg'."""
+
+  path = os.path.abspath(path)
+  with _registry_lock:
+    for dawg in _registry.values():
+      if dawg.path == path:
+        return dawg
+    if path not in _mapped:
+      _mapped[path] = load(path)
+    return _mapped[path]
+
+def open_language(language, dictionary=None):
+  """Loads the compiled lexicon of a language, compiling it first if it's
+  missing or older than the dictionary. Prefer `get', which only does this
+  once per process.
+
+  @param language: A language class from `bag'.
+  @param dictionary: The word list to use instead of `language.dictionary'.
+
+  @returns: A `MappedDawg'."""
+
+  dictionary = dictionary or language.dictionary
+  path = path_for(language, dictionary)
+  if _is_stale(path, dictionary):
+    build(language, path, dictionary)
+  return load(path)
+
+def _header(nodes, edges, letters, digraphs):
+  return HEADER.pack(MAGIC, VERSION, BYTE_ORDER, ctypes.sizeof(CTYPES[MASK_TYPE]), nodes, edges, letters, digraphs)
+
+def _is_stale(path, dictionary):
+  if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(dictionary):
+    return True
+
+  f = open(path, 'rb')
+  try:
+    header = f.read(HEADER.size)
+  finally:
+    f.close()
+  return len(header) < HEADER.size or header[:16] != _header(0, 0, 0, 0)[:16]
+
+class MappedDawg (Dawg):
+  """A read-only `Dawg' whose tables are views of a memory mapped compiled
+  lexicon."""
+
+  def __init__(self, buf, path=None):
+    if len(buf) < HEADER.size or buf[:16] != _header(0, 0, 0, 0)[:16]:
+      raise DawgError("Not a compatible compiled lexicon.")
+
+    counts = HEADER.unpack_from(buf, 0)[4:]
+    node_count, edge_count, letters, digraphs = counts
+
+    offset = HEADER.size
+    alphabet = [l for l in buf[offset:offset + letters].decode('UTF-8').split(u'\n') if l]
+    offset += letters
+    digraph_list = [dg for dg in buf[offset:offset + digraphs].decode('UTF-8').split(u'\n') if dg]
+    offset += digraphs
+
+    super(MappedDawg, self).__init__(digraphs=digraph_list, minimize=True)
+
+    self.buf = buf
+    self.path = path and os.path.abspath(path)
+    self.alphabet = alphabet
+    self.symbols = dict((l, i) for i, l in enumerate(alphabet))
+
+    sizes = {'masks': node_count, 'first': node_count, 'targets': edge_count, 'accepting': node_count}
+    for name, typecode in TABLES:
+      offset += -offset % 8
+      table = (CTYPES[typecode] * sizes[name]).from_buffer(buf, offset)
+      setattr(self, name, table)
+      offset += ctypes.sizeof(table)
+
+    self.graph = Edges(self)
+    self.accepts = Accepts(self)
+    self._register = self._previous = None
+    self.finished = True
+
+  def __reduce__(self):
+    if self.path is None:
+      raise DawgError("Only lexicons loaded from a file can be pickled.")
+    return (shared, (self.path,))
+
+if __name__ == '__main__':
+  # Compile the lexicons of the languages named on the command line, e.g.
+  #   python lexicon.py en es
+  for name in sys.argv[1:] or ['en']:
+    print "Compiling %s..." % name
+    print build(getattr(bag, name))
@@ -1,89 +1,276 @@
-from copy import copy, deepcopy
-from random import shuffle
+from copy import copy
+from random import Random, shuffle
+from time import time
+
+from executor import SERIAL
+from game import GameError
+from leaves import leave
+from transposition import TranspositionTable, rack_hash
 
 SEARCH_MOVES_DEPTH = 3
 SEARCH_TURNS_DEPTH = 5
 SEARCH_RACKS_COUNT = 5
+SEARCH_TABLE_SIZE = 100000
+
+# Move lists and subtree values of the positions searched so far, keyed by
+# the Zobrist hashes of the board and rack (see `_position'). It's shared by
+# every search in the process, executor tasks included, so each worker
+# process has its own.
+TABLE = TranspositionTable(SEARCH_TABLE_SIZE)
+
+class SearchAborted (Exception):
+  """Raised inside the search once its time or node budget is spent."""
+  pass
+
+def _position(board):
+  # The hash of a board's tiles is only a position on one lexicon and layout:
+  # an empty board hashes to 0 whatever the language.
+  return (board.dawg, board.layout, board.hash)
+
+def _top_moves(board, rack, k, deadline=None):
+  # Moves cut short by the deadline aren't necessarily the best, so they're
+  # not kept.
+  key = ('moves', _position(board), rack_hash(rack), k)
+  ms = TABLE.get(key)
+  if ms is None:
+    ms = board.top_moves(rack, k, deadline)
+    if deadline is None or time() <= deadline:
+      TABLE.put(key, ms)
+  return ms
+
+def _check_deadline(deadline):
+  if deadline is not None and time() > deadline:
+    raise SearchAborted("Out of time.")
+
+def _rollout(task):
+  # Plays the naive opponent's best move from a random rack. Runs in executor
+  # workers, so it only gets what it's handed.
+  board, bag, seed, deadline = task
+  rack = Player(None)._random_rack(bag, rng=Random(seed))
+  ms = _top_moves(board, rack, 1, deadline)
+  _check_deadline(deadline)
+  if len(ms) != 0:
+    return ms[0][4]
+  return 0
+
+def _subtree(task):
+  # Searches beneath one candidate move. Anything below runs serially, since
+  # the task is already in a worker. Tasks on threads share the board and bag
+  # they were handed, so this one gets its own to make and unmake moves on.
+  move, rack, board, bag, depth, total, seed, deadline, max_nodes, leaves, candidates, verbose = task
+  player = Player(None, leaves=leaves, candidates=candidates, verbose=verbose)
+  player._deadline, player._max_nodes = deadline, max_nodes
+  delta = player._rfetch_score_delta(move, rack, copy(board), copy(bag), depth, total, Random(seed), SERIAL)
+  return delta, player.nodes
 
 class Player:
-  def __init__(self, game):
+  def __init__(self, game, executor=None, seed=None, leaves=None, candidates=None, verbose=True):
+    """@param game: The Game being played.
+    @param executor: What to run the search's rollouts and candidate subtrees
+      on (see `executor'), serially by default.
+    @param seed: Seeds the search's random racks. Each rollout and subtree
+      gets its own seed, so they don't depend on which executor runs them.
+    @param leaves: A `leaves.LeaveTable'. If there is one, moves are ranked
+      by their score plus the value of the tiles they leave rather than by
+      score alone.
+    @param candidates: How many of the best moves to search further at every
+      turn. By default it's as many as there are turns left to search, so a
+      search one turn deep only ever looks further at the best move.
+    @param verbose: Whether the search prints the best move of every node."""
+
     self.rack = ""
     self.history = []
     self.game = game
+    self.executor = executor or SERIAL
+    self.random = Random(seed)
+    self.table = TABLE
+    self.leaves = leaves
+    self.candidates = candidates
+    self.verbose = verbose
+
+    # How deep the last call to `move' searched and how many nodes it
+    # expanded, and the budget of the search in progress.
+    self.depth = 0
+    self.nodes = 0
+    self._deadline = None
+    self._max_nodes = None
 
-  def _random_rack(self, bag, existing=None):
+  def _random_rack(self, bag, existing=None, rng=None, draw=False):
     # Create a random rack where tile occurance is weighted to the current bag.
-    if existing:
-      count = 7 - len(existing)
+    # Unless they're drawn the tiles stay in the bag, which rollouts on
+    # threads share.
+    existing = list(existing or [])
+    if draw:
+      return existing + bag.draw_rack(7 - len(existing), rng)
     else:
-      count = min(len(bag.bag), 7)
-
-    ret = [bag.random(draw = False) for i in xrange(count)]
-    if existing: 
-      ret = existing + ret
-
-    return ret
-
-  def _average_random(self, board, bag):
-    # TODO: Parallelize this method.
-
-    total = 0
-    # Generate a hypothetical new rack.
-    for i in xrange(SEARCH_RACKS_COUNT):
-      # Next play the hypothetical AI's. The AI is naive and just plays the
-      # best possible move available given his random rack.
-      #
-      # TODO: Figure out how to make the AI less naive without adding too
-      # much computation complexity (Ha!)
-      rack = self._random_rack(bag)
-      ms = board.moves(rack)
-      if len(ms) != 0:
-        total += ms[0][4]
+      return existing + bag.sample(7 - len(existing), rng)
+
+  def _average_random(self, board, bag, rng, executor):
+    # Every rollout gets its own seed, drawn up front so that they don't
+    # depend on the order the executor runs them in.
+    #
+    # TODO: Figure out how to make the AI less naive without adding too
+    # much computation complexity (Ha!)
+    _check_deadline(self._deadline)
+    tasks = [(board, bag, rng.getrandbits(32), self._deadline) for i in xrange(SEARCH_RACKS_COUNT)]
+    total = sum(executor.map(_rollout, tasks))
 
     return float(total) / float(SEARCH_RACKS_COUNT)
 
-  def _rfetch_score_delta(self, move, rack, board, depth, total):
+  def _rfetch_score_delta(self, move, rack, board, bag, depth, total, rng, executor):
     if depth < 0:
       return total 
 
-    board_copy = copy(board); board_copy.grid = deepcopy(board.grid)
-    bag_copy = deepcopy(self.game.bag)
-
-    # First do the player's move.
-    total += board_copy.play(move[0], move[2], move[3])
+    self._count_node()
 
-    # Get the average score for the opponent's next play.
-    total -= self._average_random(board_copy, bag_copy)
+    # First do the player's move. It's made on the board and bag themselves
+    # and taken back afterwards, rather than on copies, which has to happen
+    # even if the search is aborted somewhere below.
+    kept = leave(board, rack, move)
+    board.play(move[0], move[2], move[3])
+    total += move[4]
+    drawn = 0
+    try:
+      # Get the average score for the opponent's next play.
+      total -= self._average_random(board, bag, rng, executor)
 
-    # Fill up the player's rack with some random tiles.
-    rack = filter(lambda l: l not in move[1], rack)
-    rack = self._random_rack(bag_copy, rack)
+      # Fill up the player's rack with some random tiles.
+      rack = self._random_rack(bag, kept, rng, draw=True)
+      drawn = len(rack) - len(kept)
 
-    # Play the next best move
-    best = self._best_move(board_copy, rack, depth, total)
+      # Play the next best move
+      best = self._best_move(board, rack, bag, depth, total, rng, executor)
+    finally:
+      bag.undo(drawn)
+      board.undo()
 
+    # The best move's value already counts everything up to it.
     if best:
-      return total + best[1]
+      return best[1]
     else:
       return total
 
-  def _best_move(self, board, rack, depth, total):
-    # For each of the top moves available, find the score delta.
-    ms = board.moves(rack)[:depth]
+  def _best_move(self, board, rack, bag, depth, total, rng, executor):
+    # For each of the top moves available, find the score delta. With more
+    # than one candidate the executor gets the subtrees, otherwise it's
+    # passed down to the rollouts. Only one level ever uses it, so workers
+    # never wait on tasks queued behind them.
+    #
+    # A position can be reached through different move orders, so the best
+    # move and its delta less the running total are kept in the table. The
+    # rollouts and refills depend on the tiles still unseen too, so the same
+    # board and rack with a different bag (e.g. in another game) is another
+    # position.
+    # There's nothing left to search beneath the last turn, so there are no
+    # candidates to look at there.
+    k = 0 if depth <= 0 else (self.candidates or depth)
+    key = ('value', _position(board), rack_hash(rack), tuple(bag.counts), depth, k, self.leaves is None)
+    cached = TABLE.get(key)
+    if cached is not None:
+      m, delta = cached
+      return m and (m, total + delta)
+
+    ms = self._candidates(board, rack, k)
+    _check_deadline(self._deadline)
     best = None
 
-    for m in ms: 
-      delta = self._rfetch_score_delta(m, rack, board, depth - 1, total)
+    tasks = [(m, rack, board, bag, depth - 1, total, rng.getrandbits(32)) for m in ms]
+    if len(tasks) > 1 and executor is not SERIAL:
+      # Workers can't see each other's node counts, so each gets an even
+      # share of what's left of the budget.
+      max_nodes = self._max_nodes
+      if max_nodes is not None:
+        max_nodes = (max_nodes - self.nodes) / len(tasks)
+
+      results = executor.map(_subtree, [t + (self._deadline, max_nodes, self.leaves, self.candidates, self.verbose) for t in tasks])
+      deltas = [delta for delta, nodes in results]
+      self.nodes += sum(nodes for delta, nodes in results)
+    else:
+      deltas = [self._rfetch_score_delta(m, r, b, g, d, t, Random(seed), executor) for m, r, b, g, d, t, seed in tasks]
+
+    for m, delta in zip(ms, deltas):
       if not best or best[1] < delta:
         best = (m, delta)
 
-    prefix = " " * (3 - depth) 
     if best:
+      TABLE.put(key, (best[0], best[1] - total))
+    else:
+      TABLE.put(key, (None, 0))
+
+    prefix = " " * (3 - depth) 
+    if best and self.verbose:
       print "%s(%r, %d)" % (prefix, best[0], best[1])
     return best
 
-  def move(self):
-    return self._best_move(self.game.board, self.rack, 4, 0)
+  def move(self, time_budget=None, max_nodes=None, max_depth=4):
+    """Finds the best move for the player's rack.
+
+    Moves are first ranked statically, by score plus leave if the player has
+    a leave table, and with a `max_depth' of 0 the best of them is returned
+    straight away. Otherwise without a budget the search goes straight to
+    `max_depth'. With one it deepens a turn at a time, and when the budget
+    runs out it returns the result of the deepest search that finished, or
+    the statically best move if not even the first one did. The time budget
+    covers the static ranking too: if it runs out there, the best move found
+    so far is returned. Afterwards `depth' is how deep that search went and
+    `nodes' how many nodes were expanded in all.
+
+    The value returned with the move is what the line searched nets the
+    player: its score, less the opponent's average reply, plus what the
+    player's best moves after that net, `depth' turns deep. With a `depth' of
+    0 that line is the move alone, so the value is just its score.
+
+    @param time_budget: The most seconds to spend, ranking and searching.
+    @param max_nodes: The most nodes to expand.
+    @param max_depth: How many turns ahead to look at most.
+
+    @returns: A (move, value) tuple, or None if there are no moves (or none
+      were found in time)."""
+
+    board, bag = self.game.board, self.game.bag
+
+    self.depth = self.nodes = 0
+    self._max_nodes = max_nodes
+    if time_budget is not None:
+      self._deadline = time() + time_budget
+
+    if max_depth < 1:
+      depths = []
+    elif time_budget is None and max_nodes is None:
+      depths = [max_depth]
+    else:
+      depths = xrange(1, max_depth + 1)
+
+    try:
+      ms = self._candidates(board, self.rack, 1)
+      if not ms:
+        return None
+      best = (ms[0], ms[0][4])
+
+      for depth in depths:
+        best = self._best_move(board, self.rack, bag, depth, 0, self.random, self.executor)
+        self.depth = depth
+    except SearchAborted:
+      pass
+    finally:
+      self._deadline = self._max_nodes = None
+
+    return best
+
+  def _candidates(self, board, rack, k):
+    # The `k' best moves to search further, or the best found by the
+    # deadline.
+    if self.leaves is None:
+      return _top_moves(board, rack, k, self._deadline)
+
+    equity = lambda m: m[4] + self.leaves.value(leave(board, rack, m))
+    return sorted(board.iter_moves(rack, self._deadline), key=equity, reverse=True)[:k]
+
+  def _count_node(self):
+    self.nodes += 1
+    if self._max_nodes is not None and self.nodes > self._max_nodes:
+      raise SearchAborted("Searched %d nodes." % self._max_nodes)
+    _check_deadline(self._deadline)
 
   def draw(self, letters):
     self.rack += self.game.draw(letters)
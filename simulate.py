@@ -0,0 +1,218 @@
+import json
+import sys
+from random import Random
+from timeit import default_timer as clock
+
+import bag
+from executor import SERIAL, create
+from game import Game
+from leaves import LeaveTable, leave, path_for
+import player
+
+# How many tiles a rack holds. Tiles can only be exchanged while there are at
+# least this many left in the bag.
+RACK_SIZE = 7
+
+# A game ends once this many turns in a row have scored nothing, passes and
+# exchanges included.
+SCORELESS_TURNS = 6
+
+# How many turns ahead `lookahead' looks, and how many of the best moves it
+# looks further at every turn, unless it's told otherwise. One turn looking
+# at one move would just play the highest scoring move.
+LOOKAHEAD_DEPTH = 2
+LOOKAHEAD_CANDIDATES = 3
+
+class SimulationError (Exception):
+  pass
+
+class Greedy (object):
+  """Plays the highest scoring move."""
+
+  def choose(self, game, rack, rng):
+    ms = game.board.top_moves(rack, 1)
+    return ms[0] if ms else None
+
+class Search (object):
+  """Plays the move `Player.move' picks, with or without a leave table and
+  looking ahead."""
+
+  def __init__(self, leaves=None, max_depth=LOOKAHEAD_DEPTH, candidates=LOOKAHEAD_CANDIDATES, max_nodes=None, time_budget=None):
+    """@param leaves: A `leaves.LeaveTable' to rank moves with.
+    @param max_depth: How many turns ahead to look, 0 to just rank them.
+    @param candidates: How many moves to look further at every turn (see
+      `Player').
+    @param max_nodes: The most nodes to search per move.
+    @param time_budget: The most seconds to search per move."""
+
+    self.leaves = leaves
+    self.max_depth = max_depth
+    self.candidates = candidates
+    self.max_nodes = max_nodes
+    self.time_budget = time_budget
+
+  def choose(self, game, rack, rng):
+    p = player.Player(game, seed=rng.getrandbits(32), leaves=self.leaves, candidates=self.candidates, verbose=False)
+    p.rack = rack
+    best = p.move(self.time_budget, self.max_nodes, self.max_depth)
+    return best and best[0]
+
+def strategy(spec, language=bag.en):
+  """Makes a strategy from its name:
+
+    greedy             the highest scoring move
+    leave[:path]       the best score plus leave, with the language's leave
+                       table or the one at `path'
+    lookahead[:n[:k]]  the best move looking `n' turns ahead, at the `k' best
+                       moves every turn
+
+  @param spec: The name, e.g. `lookahead:2:3'.
+  @param language: A language class from `bag'.
+
+  @returns: An object whose `choose(game, rack, rng)' returns a move, or None
+    to exchange or pass."""
+
+  name, _, arg = spec.partition(':')
+  if name == 'greedy':
+    return Greedy()
+  elif name == 'leave':
+    return Search(LeaveTable.load(arg or path_for(language)), max_depth=0)
+  elif name == 'lookahead':
+    depth, _, k = arg.partition(':')
+    return Search(max_depth=int(depth or LOOKAHEAD_DEPTH), candidates=int(k or LOOKAHEAD_CANDIDATES))
+  raise SimulationError("There's no `%s' strategy." % spec)
+
+def run(language, games, specs, seed=None, executor=SERIAL, out=sys.stdout):
+  """Plays complete games between strategies, writing a JSON object per move
+  and then one per game to `out', one per line, in the order the games were
+  started.
+
+  Seats take turns going first from one game to the next. Every game gets
+  its own seed, so with the serial or process executor a game plays out the
+  same no matter which worker plays it.
+
+  @param language: A language class from `bag'.
+  @param games: How many games to play.
+  @param specs: The strategy of each seat (see `strategy').
+  @param seed: Seeds the games.
+  @param executor: What to play the games on (see `executor').
+  @param out: A file, or None not to write anything.
+
+  @returns: A list of the games' summary dicts."""
+
+  strategies = [strategy(s, language) for s in specs]
+  rng = Random(seed)
+  tasks = [(language, specs, strategies, i, rng.getrandbits(32)) for i in xrange(games)]
+
+  results = []
+  for log, summary in executor.imap(play_game, tasks):
+    if out is not None:
+      for entry in log + [summary]:
+        out.write(json.dumps(entry, sort_keys=True) + '\n')
+      out.flush()
+    results.append(summary)
+  return results
+
+def play_game(task):
+  """Plays a game to the end. Runs in executor workers, so it only gets what
+  it's handed.
+
+  @param task: A (language, specs, strategies, index, seed) tuple.
+
+  @returns: A (log, summary) tuple: a dict for every turn, and one for the
+    game."""
+
+  language, specs, strategies, index, seed = task
+  rng = Random(seed)
+  game = Game(language)
+  board, tiles = game.board, game.bag
+  seats = len(strategies)
+
+  # Searches share their table, and what's in it depends on what was played
+  # before, so every game starts from an empty one.
+  player.TABLE.clear()
+
+  racks = [tiles.draw_rack(RACK_SIZE, rng) for s in strategies]
+  scores = [0] * seats
+  log = []
+
+  started = clock()
+  turn = scoreless = 0
+  while True:
+    seat = (index + turn) % seats
+    rack = racks[seat]
+
+    start = clock()
+    move = strategies[seat].choose(game, rack, rng)
+    entry = {'game': index, 'turn': turn, 'seat': seat, 'rack': ''.join(rack)}
+
+    if move:
+      # Playing the word scores its letters, blanks included, so the score is
+      # the move's own.
+      kept = leave(board, rack, move)
+      game.play(move[0], move[2], move[3])
+      score = move[4]
+      racks[seat] = kept + tiles.draw_rack(RACK_SIZE - len(kept), rng)
+      entry.update(action='play', word=move[0], tiles=move[1], start=move[2], end=move[3], score=score)
+    elif tiles.remaining() >= RACK_SIZE:
+      # Draw the new tiles before the old ones go back.
+      racks[seat] = tiles.draw_rack(RACK_SIZE, rng)
+      for tile in rack:
+        tiles.put(tile)
+      score = 0
+      entry.update(action='exchange', score=0)
+    else:
+      score = 0
+      entry.update(action='pass', score=0)
+
+    scores[seat] += score
+    scoreless = 0 if score else scoreless + 1
+    entry.update(total=scores[seat], bag=tiles.remaining(), seconds=round(clock() - start, 6))
+    log.append(entry)
+    turn += 1
+
+    # Once someone goes out they get the value of everyone else's tiles,
+    # which everyone else loses. If the game stalls instead, everyone just
+    # loses what they're left with.
+    if not racks[seat] and not tiles.remaining():
+      for other in xrange(seats):
+        left = sum(language.scores[t] for t in racks[other])
+        scores[other] -= left
+        scores[seat] += left
+      end = 'out'
+      break
+    elif scoreless >= SCORELESS_TURNS:
+      for other in xrange(seats):
+        scores[other] -= sum(language.scores[t] for t in racks[other])
+      end = 'scoreless'
+      break
+
+  best = max(scores)
+  winners = [s for s in xrange(seats) if scores[s] == best]
+  summary = {
+    'game': index,
+    'seed': seed,
+    'strategies': list(specs),
+    'scores': scores,
+    'winner': winners[0] if len(winners) == 1 else None,
+    'end': end,
+    'turns': turn,
+    'seconds': round(clock() - started, 6)
+  }
+  return log, summary
+
+if __name__ == '__main__':
+  # Plays games between strategies on every core, e.g.
+  #   python simulate.py en 100 greedy leave > games.json
+  name = sys.argv[1] if len(sys.argv) > 1 else 'en'
+  games = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+  specs = sys.argv[3:] or ['greedy', 'greedy']
+
+  pool = create('process')
+  try:
+    results = run(getattr(bag, name), games, specs, executor=pool)
+  finally:
+    pool.close()
+
+  wins = [sum(1 for r in results if r['winner'] == s) for s in xrange(len(specs))]
+  sys.stderr.write("wins %s\n" % ', '.join('%s %d' % (s, w) for s, w in zip(specs, wins)))
@@ -0,0 +1,50 @@
+import unittest
+
+from board import Board, BoardError
+
+class ValidateTest (unittest.TestCase):
+  def setUp(self):
+    self.board = Board()
+    self.board.play('decaf', (7,7), (11,7))
+
+  def test_blank(self):
+    # A blank is worth nothing, wherever it's played.
+    b = self.board
+    self.assertEqual(b.validate('quest', (12,4), (12,8)), 28)
+    self.assertEqual(b.validate('quest', (12,4), (12,8), 'q_est'), 27)
+    self.assertEqual(b.score('quest', (12,4), (12,8), 'q_est'), 27)
+
+    move = [m for m in b.moves('q_est') if m[1] == 'q_est'][0]
+    self.assertEqual(move, ('quest', 'q_est', (12,4), (12,8), 27))
+
+  def test_blank_cross_word(self):
+    # `net' makes `de' and `et' under `decaf', and the blank `e' counts for
+    # nothing in either.
+    b = self.board
+    self.assertEqual(b.validate('net', (6,8), (8,8)), 11)
+    self.assertEqual(b.validate('net', (6,8), (8,8), 'n_t'), 9)
+    self.assertTrue(('net', 'n_t', (6,8), (8,8), 9) in b.moves('n_t'))
+
+  def test_blank_tile(self):
+    b = self.board
+    self.assertEqual(b.validate('e', (7,8), (7,8)), 3)
+    self.assertEqual(b.validate('e', (7,8), (7,8), '_'), 2)
+
+  def test_tiles_not_the_word(self):
+    b = self.board
+    self.assertRaises(BoardError, b.validate, 'quest', (12,4), (12,8), 'quast')
+    self.assertRaises(BoardError, b.validate, 'quest', (12,4), (12,8), 'q_es')
+
+  def test_cross_word(self):
+    b = self.board
+    self.assertRaises(BoardError, b.validate, 'at', (7,8), (8,8))
+    self.assertRaises(BoardError, b.validate, 'ax', (8,6), (9,6))
+
+  def test_unconnected(self):
+    b = self.board
+    self.assertRaises(BoardError, b.validate, 'cat', (0,0), (2,0))
+    self.assertRaises(BoardError, b.validate, 'a', (3,3), (3,3))
+    self.assertRaises(BoardError, b.validate, 'cat', (0,0), (2,0), 'c_t')
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,87 @@
+import threading
+from collections import OrderedDict
+from random import Random
+
+# Zobrist keys: every (square, letter) and (letter, count) pair gets a random
+# 64 bit key, and a position or rack hashes to the XOR of the keys of what's
+# in it. Placing or removing a tile is then a single XOR, and two positions
+# reached through different move orders hash the same. The keys are derived
+# from the items themselves so that they're the same in every process.
+_keys = {}
+
+def key(*item):
+  """Returns the Zobrist key of an item, e.g. key('square', 112, 'a')."""
+
+  try:
+    return _keys[item]
+  except KeyError:
+    k = _keys[item] = Random(repr(item)).getrandbits(64)
+    return k
+
+def rack_hash(rack):
+  """Hashes a rack as a multiset, so the order of its letters doesn't matter.
+
+  @param rack: An iterable of letters.
+
+  @returns: A 64 bit hash."""
+
+  counts = {}
+  for letter in rack:
+    counts[letter] = counts.get(letter, 0) + 1
+
+  h = 0
+  for letter, count in counts.iteritems():
+    h ^= key('rack', letter, count)
+  return h
+
+class TranspositionTable (object):
+  """A bounded cache of search results. Once it's full, the least recently
+  used entry is evicted to make room for a new one. It's safe to share
+  between threads."""
+
+  def __init__(self, size):
+    """@param size: The most entries to keep."""
+
+    self.size = size
+    self.hits = 0
+    self.misses = 0
+
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+
+  def __len__(self):
+    return len(self._entries)
+
+  def get(self, key, default=None):
+    """Looks up an entry, counting a hit or a miss.
+
+    @param key: Anything hashable, usually a tuple of Zobrist hashes.
+    @param default: What to return if there's no entry.
+
+    @returns: The entry's value, or `default'."""
+
+    with self._lock:
+      try:
+        value = self._entries.pop(key)
+      except KeyError:
+        self.misses += 1
+        return default
+
+      # Move it to the most recently used end.
+      self._entries[key] = value
+      self.hits += 1
+      return value
+
+  def put(self, key, value):
+    with self._lock:
+      self._entries.pop(key, None)
+      self._entries[key] = value
+      while len(self._entries) > self.size:
+        self._entries.popitem(last=False)
+
+  def clear(self):
+    """Empties the table and resets the counters."""
+
+    with self._lock:
+      self._entries.clear()
+      self.hits = self.misses = 0